@@ -0,0 +1,256 @@
+"""Local stand-in for Aula, UniLogin and the widget providers.
+
+Answers are built from the templates in fixtures/, repeated for the number of
+children, threads and lessons asked for. Every request is recorded in
+app["calls"] and delayed by app["latency"] seconds.
+"""
+import asyncio
+import datetime
+import json
+from pathlib import Path
+import re
+
+from aiohttp import web
+
+FIXTURES = Path(__file__).parent / "fixtures"
+API_VERSION = 22
+USERNAME = "user"
+PASSWORD = "pass"
+UPSTREAMS = (
+    "https://login.aula.dk",
+    "https://broker.unilogin.dk",
+    "https://www.aula.dk",
+    "https://api.minuddannelse.net",
+    "https://app.meebook.com",
+    "https://systematic-momo.dk",
+)
+PLACEHOLDER = re.compile(r"^\{(\w+)\}$")
+ACCOUNT = re.compile(re.escape(USERNAME) + r"\d*")
+
+
+def fixture(name):
+    """Load a fixture template."""
+    with open(FIXTURES / f"{name}.json", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def fill(template, **values):
+    """Fill in a template; a lone "{name}" keeps the type of its value."""
+    if isinstance(template, dict):
+        return {key: fill(value, **values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill(value, **values) for value in template]
+    if isinstance(template, str):
+        match = PLACEHOLDER.match(template)
+        if match:
+            return values[match.group(1)]
+        if "{" in template:
+            return template.format_map(values)
+    return template
+
+
+def rewrite(base):
+    """Transport rewrite that sends every upstream to the mock at base."""
+    return {upstream: f"{base}/{upstream[8:]}" for upstream in UPSTREAMS}
+
+
+class MockAula:
+    """Request handlers and state of the mock."""
+
+    def __init__(self, children=3, threads=4, lessons=6, latency=0.0) -> None:
+        """Init."""
+        self.children = children
+        self.threads = threads
+        self.lessons = lessons
+        self.latency = latency
+        self.base = None
+        self.calls = []
+        self.sessions = set()
+        self.logins = 0
+        self.templates = {
+            path.stem: fixture(path.stem) for path in FIXTURES.glob("*.json")
+        }
+
+    def child(self, i):
+        """Values of the i'th child."""
+        return {
+            "i": i,
+            "code": str(100 + i),
+            "child_id": 1000 + i,
+            "user_id": str(5000 + i),
+        }
+
+    def app(self) -> web.Application:
+        """The aiohttp application."""
+        app = web.Application()
+        app["mock"] = self
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request):
+        """Dispatch on the upstream host, the first path segment."""
+        self.calls.append((request.method, request.path, request.query_string))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        _, host, path = request.path.split("/", 2)
+        path = "/" + path
+        if host == "login.aula.dk":
+            return self.form("https://broker.unilogin.dk/login", {})
+        if host == "broker.unilogin.dk":
+            return await self.unilogin(request, path)
+        if host == "www.aula.dk":
+            return await self.aula(request, path)
+        if host == "api.minuddannelse.net":
+            return self.minuddannelse(request, path)
+        if host == "app.meebook.com":
+            return web.json_response(
+                [
+                    fill(self.templates["meebook"], **self.child(i))
+                    for i in range(self.children)
+                ]
+            )
+        if host == "systematic-momo.dk":
+            return web.json_response(
+                [
+                    fill(self.templates["huskelisten"], **self.child(i))
+                    for i in range(self.children)
+                ]
+            )
+        return web.Response(status=404)
+
+    def form(self, action, fields):
+        """An auto-submitting form like the ones in the UniLogin chain."""
+        inputs = "".join(
+            f'<input type="hidden" name="{key}" value="{value}"/>'
+            for key, value in fields.items()
+        )
+        return web.Response(
+            text=f'<html><body><form method="post" action="{action}">{inputs}'
+            "</form></body></html>",
+            content_type="text/html",
+        )
+
+    async def unilogin(self, request, path):
+        """Broker page, then the credential form, then the SAML post."""
+        if path == "/login":
+            return self.form(
+                "https://broker.unilogin.dk/idp",
+                {"username": "", "password": "", "selected-aktoer": ""},
+            )
+        data = await request.post()
+        # user, user1, user2... for benchmarks with several accounts.
+        username = data.get("username", "")
+        if not ACCOUNT.fullmatch(username) or data.get("password") != PASSWORD:
+            return web.Response(status=403, text="Forkert brugernavn eller kodeord")
+        return self.form("https://www.aula.dk/auth/saml", {"SAMLResponse": "x"})
+
+    async def aula(self, request, path):
+        """Portal login and the versioned API."""
+        if path == "/auth/saml":
+            self.logins += 1
+            session = f"session{self.logins}"
+            self.sessions.add(session)
+            base = self.base or str(request.url.origin())
+            response = web.HTTPFound(f"{base}/www.aula.dk/portal/")
+            response.set_cookie("PHPSESSID", session, path="/")
+            response.set_cookie("Csrfp-Token", "csrf", path="/")
+            raise response
+        if path == "/portal/":
+            return web.Response(text="<html>Aula</html>", content_type="text/html")
+        version = int(path.rsplit("v", 1)[1])
+        if version < API_VERSION:
+            return web.Response(status=410)
+        if version > API_VERSION:
+            return web.Response(status=404)
+        if request.cookies.get("PHPSESSID") not in self.sessions:
+            return web.json_response(
+                {"status": {"code": 448, "message": "Not logged in"}}, status=403
+            )
+        return await self.api(request)
+
+    async def api(self, request):
+        """Aula API methods."""
+        method = request.query.get("method")
+        if method == "profiles.getProfilesByLogin":
+            return ok({"profiles": [{"id": 1}]})
+        if method == "profiles.getProfileContext":
+            context = fill(self.templates["profile_context"])
+            context["institutions"] = [
+                fill(self.templates["institution"], **self.child(i))
+                for i in range(self.children)
+            ]
+            return ok(context)
+        if method == "presence.getDailyOverview":
+            return ok(
+                [
+                    fill(self.templates["presence"], child_id=int(child_id))
+                    for child_id in request.query.getall("childIds[]", [])
+                ]
+            )
+        if method == "messaging.getThreads":
+            return ok(
+                {
+                    "threads": [
+                        fill(self.templates["thread"], thread_id=900 + t)
+                        for t in range(self.threads)
+                    ]
+                }
+            )
+        if method == "messaging.getMessagesForThread":
+            thread_id = int(request.query["threadId"])
+            return ok(fill(self.templates["messages"], thread_id=thread_id))
+        if method == "calendar.getEventsByProfileIdsAndResourceIds":
+            return ok(self.calendar(json.loads(await request.text())))
+        if method == "aulaToken.getAulaToken":
+            return ok("token")
+        return ok({})
+
+    def calendar(self, body):
+        """Lessons on each weekday of the requested week, for every child."""
+        start = datetime.datetime.strptime(body["start"][:10], "%Y-%m-%d").replace(
+            tzinfo=datetime.UTC
+        )
+        events = []
+        for child_id in body["instProfileIds"]:
+            for day in range(5):
+                first = start + datetime.timedelta(days=day, hours=7)
+                for n in range(self.lessons):
+                    lesson_start = first + datetime.timedelta(hours=n)
+                    events.append(
+                        fill(
+                            self.templates["lesson"],
+                            n=n,
+                            child_id=child_id,
+                            start=lesson_start.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+                            end=(
+                                lesson_start + datetime.timedelta(minutes=45)
+                            ).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+                        )
+                    )
+        return events
+
+    def minuddannelse(self, request, path):
+        """Ugebrev (0029) and opgaveliste (0030)."""
+        week = request.query.get("currentWeekNumber", "")
+        if path.endswith("/ugebrev"):
+            return web.json_response(
+                {
+                    "personer": [
+                        fill(self.templates["ugebrev"], week=week, **self.child(i))
+                        for i in range(self.children)
+                    ]
+                }
+            )
+        return web.json_response(
+            {
+                "opgaver": [
+                    fill(self.templates["opgave"], **self.child(i))
+                    for i in range(self.children)
+                ]
+            }
+        )
+
+
+def ok(data):
+    """An Aula API answer."""
+    return web.json_response({"status": {"code": 0, "message": "OK"}, "data": data})
@@ -0,0 +1,167 @@
+"""Benchmark Client.login and Client.update_data against the local mock.
+
+Usage: python benchmarks/run.py [--cycles N] [--latency S] [--children N]
+                                [--threads N] [--lessons N] [--accounts N]
+                                [--json FILE]
+                                [--record FILE | --replay FILE [--realtime]]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp.test_utils import TestServer
+from mock_server import PASSWORD, USERNAME, MockAula, rewrite
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.aula.client import Client  # noqa: E402
+from custom_components.aula.fleet import Fleet  # noqa: E402
+from custom_components.aula.transport import Cassette, Transport  # noqa: E402
+
+
+def sent(clients):
+    """Requests sent by the clients so far."""
+    return sum(
+        stats["requests"]
+        for client in clients
+        for stats in client.request_stats().values()
+    )
+
+
+async def measure(clients, name, step):
+    """Run one step on every client, return requests, wall time and memory."""
+    before = sent(clients)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await asyncio.gather(*(step(client)() for client in clients))
+    wall = time.perf_counter() - start
+    return {
+        "step": name,
+        "requests": sent(clients) - before,
+        "wall_ms": round(wall * 1000, 1),
+        "peak_kib": round(tracemalloc.get_traced_memory()[1] / 1024, 1),
+    }
+
+
+async def run(args):
+    """Log in once, then run the update cycles."""
+    server = None
+    fleet = None
+    username, password = USERNAME, PASSWORD
+    if args.record:
+        # The real upstreams, with the credentials of a real account.
+        username = args.username or os.environ.get("AULA_USERNAME")
+        password = args.password or os.environ.get("AULA_PASSWORD")
+        if not username or not password:
+            sys.exit("--record needs --username and --password or AULA_USERNAME")
+        cassette = Cassette()
+        transport = Transport(record=cassette)
+    elif args.replay:
+        transport = Transport(replay=Cassette.load(args.replay), realtime=args.realtime)
+    else:
+        mock = MockAula(args.children, args.threads, args.lessons, args.latency)
+        server = TestServer(mock.app(), host="localhost")
+        await server.start_server()
+        # By name: cookies set by a bare IP address are not kept.
+        mock.base = f"http://localhost:{server.port}"
+        # Every account gets its own transport, sharing the fleet's budget.
+        fleet = Fleet()
+        transport = None
+    results = []
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        if fleet is None:
+            clients = [
+                Client(hass, username, password, True, True, transport=transport)
+            ]
+        else:
+            clients = [
+                Client(
+                    hass,
+                    f"{USERNAME}{i}" if i else USERNAME,
+                    PASSWORD,
+                    True,
+                    True,
+                    transport=Transport(
+                        rewrite=rewrite(mock.base), limit=fleet.requests
+                    ),
+                    fleet=fleet,
+                )
+                for i in range(args.accounts)
+            ]
+        tracemalloc.start()
+        try:
+            results.append(
+                await measure(clients, "login", lambda client: client.login)
+            )
+            for cycle in range(args.cycles):
+                results.append(
+                    await measure(
+                        clients,
+                        f"update {cycle}",
+                        lambda client: client.update_data,
+                    )
+                )
+            if args.record:
+                cassette.save(args.record, clients[0].anonymization())
+        finally:
+            tracemalloc.stop()
+            for client in clients:
+                await client.async_close()
+            if fleet is not None:
+                await fleet.async_close()
+            if server is not None:
+                await server.close()
+    return results
+
+
+def main():
+    """Parse arguments, run and report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--children", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--lessons", type=int, default=6)
+    parser.add_argument(
+        "--accounts", type=int, default=1, help="Aula accounts updated at once"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--debug", action="store_true", help="log the client")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--record", help="run against the real Aula and save the traffic here"
+    )
+    mode.add_argument("--replay", help="answer requests from this cassette")
+    parser.add_argument(
+        "--realtime", action="store_true", help="replay with recorded latencies"
+    )
+    parser.add_argument("--username", help="Aula username for --record")
+    parser.add_argument("--password", help="Aula password for --record")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.ERROR)
+
+    results = asyncio.run(run(args))
+    print(f"{'step':<10} {'requests':>8} {'wall ms':>10} {'peak KiB':>10}")
+    for result in results:
+        print(
+            f"{result['step']:<10} {result['requests']:>8} "
+            f"{result['wall_ms']:>10} {result['peak_kib']:>10}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            options = {k: v for k, v in vars(args).items() if k != "password"}
+            json.dump({"args": options, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 """Based on https://github.com/JBoye/HA-Aula."""
 
-import asyncio
 import logging
+import re
 
 from homeassistant import config_entries, core
+from homeassistant.helpers import entity_registry as er
 
+from .client import async_remove_stores
 from .const import DOMAIN
+from .fleet import async_release_fleet
 
 _LOGGER = logging.getLogger(__name__)
 
+# Unique ids from before they were prefixed with the config entry id, which
+# clashed between entries for the same children or account.
+LEGACY_UNIQUE_IDS = {
+    "sensor": (re.compile(r"aula(\d+)"), "child_{}"),
+    "calendar": (re.compile(r"aulacalendar(\d+)"), "calendar_{}"),
+    "binary_sensor": (re.compile(r"aulamessage()"), "message"),
+}
+
 
 async def async_setup_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
@@ -20,14 +31,31 @@ async def async_setup_entry(
     unsub_options_update_listener = entry.add_update_listener(options_update_listener)
     # Store a reference to the unsubscribe function to cleanup if an entry is unloaded.
     hass_data["unsub_options_update_listener"] = unsub_options_update_listener
+    # The sensor platform adds the others it forwards to, for the unload.
+    hass_data["platforms"] = ["sensor"]
     hass.data[DOMAIN][entry.entry_id] = hass_data
 
+    await er.async_migrate_entries(
+        hass, entry.entry_id, lambda entity: _migrate_unique_id(entry, entity)
+    )
     hass.async_create_task(
         hass.config_entries.async_forward_entry_setup(entry, "sensor")
     )
     return True
 
 
+@core.callback
+def _migrate_unique_id(entry: config_entries.ConfigEntry, entity: er.RegistryEntry):
+    """Prefix a legacy unique id with the config entry id."""
+    if entity.domain not in LEGACY_UNIQUE_IDS:
+        return None
+    pattern, suffix = LEGACY_UNIQUE_IDS[entity.domain]
+    match = pattern.fullmatch(entity.unique_id)
+    if match is None:
+        return None
+    return {"new_unique_id": f"{entry.entry_id}_{suffix.format(match.group(1))}"}
+
+
 async def options_update_listener(
     hass: core.HomeAssistant, config_entry: config_entries.ConfigEntry
 ):
@@ -39,16 +67,28 @@ async def async_unload_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ) -> bool:
     """Unload a config entry."""
-    unload_ok = all(
-        await asyncio.gather(
-            *[hass.config_entries.async_forward_entry_unload(entry, "sensor")]
-        )
+    data = hass.data[DOMAIN][entry.entry_id]
+    # Every platform goes, so no coordinator keeps polling a closed client.
+    unload_ok = await hass.config_entries.async_unload_platforms(
+        entry, data["platforms"]
     )
     # Remove options_update_listener.
-    hass.data[DOMAIN][entry.entry_id]["unsub_options_update_listener"]()
+    data["unsub_options_update_listener"]()
 
     # Remove config entry from domain.
     if unload_ok:
+        # Cancel in-flight fetches and release the session.
+        client = data.get("client")
+        if client is not None:
+            await client.async_close()
+        await async_release_fleet(hass)
         hass.data[DOMAIN].pop(entry.entry_id)
 
     return unload_ok
+
+
+async def async_remove_entry(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> None:
+    """Remove the stored session when a config entry is deleted."""
+    await async_remove_stores(hass, entry.entry_id)
@@ -1,5 +1,4 @@
 """Binary sensor."""
-from datetime import timedelta
 import json
 
 # from homeassistant.util import Throttle
@@ -7,13 +6,12 @@ import logging
 
 from homeassistant import config_entries, core
 from homeassistant.components.binary_sensor import BinarySensorEntity
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from .const import DOMAIN
 
 _LOGGER = logging.getLogger(__name__)
-SCAN_INTERVAL = timedelta(seconds=300.0)
 
 
 async def async_setup_entry(
@@ -22,7 +20,9 @@ async def async_setup_entry(
     async_add_entities,
 ):
     """Async setup."""
-    client = hass.data[DOMAIN]["client"]
+    config = hass.data[DOMAIN][config_entry.entry_id]
+    client = config["client"]
+    unique_id = f"{config_entry.entry_id}_message"
     if client.unread_messages > 0:
         try:
             messages = json.dumps(client.message)
@@ -33,10 +33,15 @@ async def async_setup_entry(
 
     sensors = []
     device = AulaBinarySensor(
-        hass=hass, unread=client.unread_messages, messages=messages
+        hass=hass,
+        client=client,
+        coordinator=config["coordinators"]["messages"],
+        unique_id=unique_id,
+        unread=client.unread_messages,
+        messages=messages,
     )
     sensors.append(device)
-    async_add_entities(sensors, True)
+    async_add_entities(sensors)
 
 
 class AulaBinarySensor(BinarySensorEntity, RestoreEntity):
@@ -45,12 +50,17 @@ class AulaBinarySensor(BinarySensorEntity, RestoreEntity):
     _state: any
     _messages: any
 
-    def __init__(self, hass: HomeAssistant, unread, messages) -> None:
+    def __init__(
+        self, hass: HomeAssistant, client, coordinator, unique_id, unread, messages
+    ) -> None:
         """Init."""
         self._hass = hass
         self._unread = unread
         self._messages = messages
-        self._client = self._hass.data[DOMAIN]["client"]
+        self._client = client
+        self._coordinator = coordinator
+        self._unique_id = unique_id
+        self.update()
 
     @property
     def extra_state_attributes(self):
@@ -63,8 +73,17 @@ class AulaBinarySensor(BinarySensorEntity, RestoreEntity):
     @property
     def unique_id(self):
         """Unique id."""
-        unique_id = "aulamessage"
-        return unique_id
+        return self._unique_id
+
+    @property
+    def should_poll(self):
+        """No need to poll. Coordinator notifies entity of updates."""
+        return False
+
+    @property
+    def available(self):
+        """Return if entity is available."""
+        return self._coordinator.last_update_success
 
     @property
     def icon(self):
@@ -95,3 +114,19 @@ class AulaBinarySensor(BinarySensorEntity, RestoreEntity):
             _LOGGER.debug("There are NO unread messages")
             self._state = 0
             self._messages = {}
+
+    async def async_update(self):
+        """Update the entity. Only used by the generic entity update service."""
+        await self._coordinator.async_request_refresh()
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(self._handle_coordinator_update)
+        )
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Pick up the latest messages from the client."""
+        self.update()
+        self.async_write_ha_state()
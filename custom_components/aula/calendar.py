@@ -1,21 +1,22 @@
 """Calendar."""
-from datetime import datetime, timedelta
-import json
 import logging
 
 from homeassistant import config_entries, core
 from homeassistant.components.calendar import CalendarEntity, CalendarEvent
-from homeassistant.core import HomeAssistant
-from homeassistant.util import Throttle
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
 
 from .client import Client
 from .const import CONF_SCHOOLSCHEDULE, DOMAIN
+from .schedule import LessonIndex
 
 _LOGGER = logging.getLogger(__name__)
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=10)
 PARALLEL_UPDATES = 1
 
+NO_LESSONS = LessonIndex([])
+
 
 async def async_setup_entry(
     hass: core.HomeAssistant,
@@ -28,25 +29,48 @@ async def async_setup_entry(
         config.update(config_entry.options)
     if config[CONF_SCHOOLSCHEDULE] is not True:
         return True
-    client: Client = hass.data[DOMAIN]["client"]
+    client: Client = config["client"]
+    coordinator = config["coordinators"]["calendar"]
     calendar_devices = []
     calendar = []
     for _i, child in enumerate(client.children):
         childid = child["id"]
         name = child["name"]
-        calendar_devices.append(CalendarDevice(hass, calendar, name, childid))
+        calendar_devices.append(
+            CalendarDevice(
+                hass,
+                client,
+                coordinator,
+                config_entry.entry_id,
+                calendar,
+                name,
+                childid,
+            )
+        )
     async_add_entities(calendar_devices)
 
 
 class CalendarDevice(CalendarEntity):
     """Calendar."""
 
-    def __init__(self, hass: HomeAssistant, calendar, name, childid) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: Client,
+        coordinator,
+        entry_id,
+        calendar,
+        name,
+        childid,
+    ) -> None:
         """Init."""
-        self.data = CalendarData(hass, calendar, childid)
+        self._entry_id = entry_id
+        self.data = CalendarData(hass, client, calendar, childid)
         self._cal_data = {}
         self._name = "Skoleskema " + name
         self._childid = childid
+        self._coordinator = coordinator
+        self._unsub_next = None
 
     @property
     def event(self):
@@ -61,23 +85,63 @@ class CalendarDevice(CalendarEntity):
     @property
     def unique_id(self):
         """Uniqueid."""
-        unique_id = "aulacalendar" + str(self._childid)
+        unique_id = f"{self._entry_id}_calendar_{self._childid}"
         _LOGGER.debug(f"Unique ID for calendar {str(self._childid)} {unique_id}")  # noqa: G004
         return unique_id
 
-    def update(self):
-        """Update all Calendars."""
-        self.data.update()
+    @property
+    def should_poll(self):
+        """No need to poll. The coordinator and the lesson timer update it."""
+        return False
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(self._handle_update)
+        )
+        self.async_on_remove(self._cancel_timer)
+        self._advance()
 
     async def async_get_events(self, hass: HomeAssistant, start_date, end_date):
         """Get all events in a specific time frame."""
         return await self.data.async_get_events(hass, start_date, end_date)
 
+    @callback
+    def _cancel_timer(self):
+        if self._unsub_next is not None:
+            self._unsub_next()
+            self._unsub_next = None
+
+    @callback
+    def _advance(self):
+        """Look up the current lesson and wake up when it changes."""
+        self._cancel_timer()
+        now = dt_util.utcnow()
+        event = self.data.update(now)
+        if event is not None:
+            # The next change is when this lesson starts, or when it ends.
+            wake = event.start if event.start > now else event.end
+            self._unsub_next = async_track_point_in_utc_time(
+                self.hass, self._handle_timer, wake
+            )
+
+    @callback
+    def _handle_timer(self, _now):
+        self._unsub_next = None
+        self._handle_update()
+
+    @callback
+    def _handle_update(self):
+        self._advance()
+        self.async_write_ha_state()
+
 
 class CalendarData:
     """CalendarData."""
 
-    def __init__(self, hass: HomeAssistant, calendar, childid) -> None:
+    def __init__(
+        self, hass: HomeAssistant, client: Client, calendar, childid
+    ) -> None:
         """Init."""
         self.event = None
 
@@ -85,59 +149,22 @@ class CalendarData:
         self._calendar = calendar
         self._childid = childid
 
-        self.all_events = []
-        self._client = hass.data[DOMAIN]["client"]
-
-    def parseCalendarData(self, i=None):
-        """Parse data."""
-
-        try:
-            with open("skoleskema.json", encoding="utf-8") as openfile:
-                _data = json.load(openfile)
-            data = json.loads(_data)
-        except Exception:  # pylint: disable=broad-except
-            _LOGGER.warning("Could not open and parse file skoleskema.json!")
-            return False
-        events = []
-        _LOGGER.debug("Parsing skoleskema.json")
-        for c in data["data"]:
-            if c["type"] == "lesson" and c["belongsToProfiles"][0] == self._childid:
-                summary = c["title"]
-                start = datetime.strptime(c["startDateTime"], "%Y-%m-%dT%H:%M:%S%z")
-                end = datetime.strptime(c["endDateTime"], "%Y-%m-%dT%H:%M:%S%z")
-                vikar = 0
-                for p in c["lesson"]["participants"]:
-                    if p["participantRole"] == "substituteTeacher":
-                        teacher = "VIKAR: " + p["teacherName"]
-                        vikar = 1
-                        break
-                if vikar == 0:
-                    try:
-                        teacher = c["lesson"]["participants"][0]["teacherInitials"]
-                    except Exception:  # pylint: disable=broad-except
-                        try:
-                            _LOGGER.debug(f"Lesson json dump {str(c["lesson"])}")  # noqa: G004
-                            teacher = c["lesson"]["participants"][0]["teacherName"]
-                        except Exception:  # pylint: disable=broad-except
-                            _LOGGER.debug(
-                                f"Could not find any teacher information for {summary} at {str(start)}"  # noqa: G004
-                            )  # noqa: G004
-                            teacher = ""
-                event = CalendarEvent(
-                    summary=summary + ", " + teacher,
-                    start=start,
-                    end=end,
-                )
-                events.append(event)
-        return events
+        self._client = client
 
-    async def async_get_events(self, hass: HomeAssistant, start_date, end_date):
-        """Get events."""
-        events = self.parseCalendarData()
-        return events
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Update."""
-        _LOGGER.debug("Updating calendars")
-        self.parseCalendarData(self)
+    @property
+    def lessons(self) -> LessonIndex:
+        """Lessons for this child, parsed once per fetch by the client."""
+        return self._client.lessons.get(self._childid, NO_LESSONS)
+
+    async def async_get_events(
+        self, hass: HomeAssistant, start_date, end_date
+    ) -> list[CalendarEvent]:
+        """Get events, fetching weeks that are not cached yet."""
+        return await self._client.async_get_lessons(
+            self._childid, start_date, end_date
+        )
+
+    def update(self, now):
+        """Update the current or next lesson."""
+        self.event = self.lessons.next_event(now)
+        return self.event
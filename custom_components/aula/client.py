@@ -1,63 +1,404 @@
 """Client."""
+import asyncio
+import base64
+from collections import Counter, OrderedDict
 import datetime
+import hashlib
+from http.cookies import SimpleCookie
 import json
 import logging
-import re
 import time
 
+import aiohttp
 from bs4 import BeautifulSoup
-import requests
+from yarl import URL
 
+from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.storage import Store
+from homeassistant.util.ssl import client_context
 
-from .const import API, API_VERSION, MEEBOOK_API, MIN_UDDANNELSE_API, SYSTEMATIC_API
+from .const import (
+    API,
+    API_VERSION,
+    DEFAULT_MESSAGE_CONCURRENCY,
+    DEFAULT_WIDGET_CONNECTIONS,
+    DOMAIN,
+    MEEBOOK_API,
+    MIN_UDDANNELSE_API,
+    STORAGE_VERSION,
+    SYSTEMATIC_API,
+)
+from .fleet import DNS_CACHE_TTL, WIDGET_KEEPALIVE, Account, Fleet
+from .renderer import render_huskeliste, render_meebook
+from .schedule import (
+    LessonIndex,
+    lessons_from_records,
+    lessons_to_records,
+    parse_lessons,
+)
+from .transport import WIDGET_TIMEOUT, Response, Transport
 
 _LOGGER = logging.getLogger(__name__)
 
+API_VERSION_ATTEMPTS = 10
+# How long a session is trusted after the last successful Aula response
+# before update_data checks it again.
+SESSION_TTL = 30 * 60
+# Lifetime of widget tokens without a readable expiry, and how long before
+# the expiry a token is replaced.
+WIDGET_TOKEN_TTL = 5 * 60
+WIDGET_TOKEN_MARGIN = 30
+# Institutions, children and widgets rarely change, so the profile context is
+# only fetched again after this long or on a new login.
+PROFILE_CONTEXT_TTL = 6 * 60 * 60
+# Status codes in Aula's JSON answers that mean the session is not logged in.
+NOT_LOGGED_IN = frozenset({448})
+# Longest successful answer that is checked for a not logged in status.
+STATUS_BODY_LIMIT = 1024
+# The school schedule is fetched one week at a time. The current week is
+# fetched on every calendar refresh, other weeks when they are asked for and
+# not fetched within the TTL. At most CALENDAR_WINDOWS weeks are kept, not
+# counting weeks a calendar request is still reading.
+CALENDAR_WINDOWS = 12
+CALENDAR_WINDOW_TTL = 6 * 60 * 60
+# Widget data is cached per provider, week and set of children. This week is
+# refetched hourly, next week every 15 minutes until it has been published
+# and then every 3 hours. Entries are dropped two weeks after their fetch.
+UGEPLAN_TTL = 60 * 60
+UGEPLAN_NEXT_TTL = 3 * 60 * 60
+UGEPLAN_UNPUBLISHED_TTL = 15 * 60
+UGEPLAN_MAX_AGE = 14 * 24 * 60 * 60
+# Refreshes are scheduled on whole seconds, so an entry counts as stale this
+# much before its TTL. Otherwise a refresh every TTL may just miss it.
+UGEPLAN_TTL_SLACK = 60
+UGEPLAN_SAVE_DELAY = 10
+
+
+class WidgetError(Exception):
+    """Raised when a widget provider answers with an error."""
+
+
+def _session_store(hass: HomeAssistant, entry_id) -> Store:
+    """Return the store holding the Aula session of a config entry."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.session", private=True)
+
+
+def _calendar_store(hass: HomeAssistant, entry_id) -> Store:
+    """Return the store holding the school schedules of a config entry."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.calendar")
+
+
+def _ugeplan_store(hass: HomeAssistant, entry_id) -> Store:
+    """Return the store holding the widget data of a config entry."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.ugeplan", private=True)
+
+
+async def async_remove_stores(hass: HomeAssistant, entry_id):
+    """Remove everything stored for a config entry."""
+    await _session_store(hass, entry_id).async_remove()
+    await _calendar_store(hass, entry_id).async_remove()
+    await _ugeplan_store(hass, entry_id).async_remove()
+
+
+def _is_auth_failure(response: Response, allow_status, probe=False) -> bool:
+    """Return True if Aula did not accept the session for a request.
+
+    Only HTTP 401/403 and Aula's own not logged in status count; any other
+    error is an answer to the request and is returned as is. For a probe of
+    the session any status other than OK counts.
+
+    A successful answer longer than STATUS_BODY_LIMIT holds data, so its
+    body is left for the caller to decode.
+    """
+    if response.status_code in allow_status:
+        return False
+    success = 200 <= response.status_code < 300
+    if success and not probe and len(response.text) > STATUS_BODY_LIMIT:
+        return False
+    try:
+        code = response.json()["status"]["code"]
+    except (ValueError, KeyError, TypeError):
+        code = None
+    if code in allow_status:
+        return False
+    if probe and code != 0:
+        return True
+    return response.status_code in (401, 403) or code in NOT_LOGGED_IN
+
+
+def _is_portal(url) -> bool:
+    """Return True if the login ended on the Aula portal."""
+    url = URL(str(url))
+    return url.host == "www.aula.dk" and url.path.startswith("/portal")
+
+
+def _token_expiry(token: str) -> float:
+    """Return when a widget token should be refreshed, as a unix timestamp.
+
+    Aula hands out JWTs, so the exp claim is used when it can be read.
+    """
+    try:
+        payload = token.split(".")[1]
+        padding = "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload + padding))
+        return float(claims["exp"]) - WIDGET_TOKEN_MARGIN
+    except (IndexError, ValueError, KeyError, TypeError):
+        return time.time() + WIDGET_TOKEN_TTL
+
+
+def _calendar_week(when: datetime.datetime) -> datetime.date:
+    """Monday of the (UTC) week containing when."""
+    day = when.astimezone(datetime.UTC).date()
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def _week_start(week: datetime.date) -> datetime.datetime:
+    """Midnight UTC at the start of a week."""
+    return datetime.datetime.combine(week, datetime.time(), datetime.UTC)
+
+
+def _well_formed(widget, data) -> bool:
+    """Return True if a widget answer has the shape its merge expects."""
+    if widget == "0030":
+        return isinstance(data, dict) and isinstance(data.get("opgaver"), list)
+    if widget == "0029":
+        return isinstance(data, dict) and isinstance(data.get("personer"), list)
+    return isinstance(data, list)
+
+
+def _published(widget, data) -> bool:
+    """Return True if a widget answer holds any content for the week."""
+    if widget == "0030":
+        return bool(data["opgaver"])
+    if widget == "0029":
+        return any(
+            brev.get("indhold")
+            for person in data["personer"]
+            for institution in person["institutioner"]
+            for brev in institution["ugebreve"]
+        )
+    if widget == "0004":
+        return any(day["tasks"] for person in data for day in person["weekPlan"])
+    return True
+
+
+def _ugeplan_ttl(widget, thisnext, data) -> float:
+    """How long cached widget data is used before it is fetched again."""
+    if thisnext != "next":
+        return UGEPLAN_TTL
+    try:
+        published = _published(widget, data)
+    except Exception:  # pylint: disable=broad-except
+        published = False
+    return UGEPLAN_NEXT_TTL if published else UGEPLAN_UNPUBLISHED_TTL
+
+
+def _thread_stamp(thread):
+    """Return what identifies the current state of a message thread.
+
+    None means the thread cannot be cached and is always fetched.
+    """
+    latest = thread.get("latestMessage") or {}
+    stamp = (latest.get("id"), latest.get("sendDateTime"))
+    if stamp == (None, None):
+        return None
+    return stamp
+
 
 class Client:
     """Client."""
 
-    huskeliste = {}
-    presence = {}
-    ugep_attr = {}
-    ugepnext_attr = {}
-    opg_attr = {}
-    opgnext_attr = {}
-    widgets = {}
-    tokens = {}
-    childnames = []
-    children = []
-    apiurl: str
-    _profiles: any
-    _profilecontext: any
-    _bearertoken: any
-    childnames_ = {}
-    institutions = {}
-    _childuserids = []
-    _childids = []
-    _institutionprofiles = []
-    daily_overview = {}
-    unread_messages = 0
-    message = {}
-
-    def __init__(self, username, password, schoolschedule, ugeplan) -> None:
-        """Init."""
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        username,
+        password,
+        schoolschedule,
+        ugeplan,
+        message_concurrency=DEFAULT_MESSAGE_CONCURRENCY,
+        entry_id=None,
+        widget_connections=DEFAULT_WIDGET_CONNECTIONS,
+        transport: Transport | None = None,
+        fleet: Fleet | None = None,
+    ) -> None:
+        """Init.
+
+        Clients sharing a fleet share its request budget and widget
+        connections, and clients of the same user share one Aula session.
+        """
+        self._hass = hass
         self._username = username
         self._password = password
-        self._session = None
+        self._fleet = fleet
+        self._account = fleet.account(username) if fleet else Account()
+        self._logged_in = False
         self._schoolschedule = schoolschedule
         self._ugeplan = ugeplan
+        self._message_concurrency = max(1, int(message_concurrency))
+        self._widget_connections = max(1, int(widget_connections))
+        self._widget_session: aiohttp.ClientSession | None = None
+        self._widget_slots = asyncio.Semaphore(self._widget_connections)
+        self._transport = transport or Transport(
+            limit=fleet.requests if fleet else None
+        )
+        self._tasks: set[asyncio.Task] = set()
+        self._thread_cache = {}
+        self._store = None
+        self._calendar_store = None
+        self._ugeplan_store = None
+        if entry_id is not None:
+            self._store = _session_store(hass, entry_id)
+            self._calendar_store = _calendar_store(hass, entry_id)
+            self._ugeplan_store = _ugeplan_store(hass, entry_id)
+        self._ugeplan_cache = None
+        self._ugeplan_fetches = 0
+        self._ugeplan_hits = 0
+        self._calendar_records = None
+        self._calendar_windows: OrderedDict[datetime.date, tuple] = OrderedDict()
+        self._window_locks = {}
+        self._weeks_in_use = Counter()
+        self._calendar_generation = 0
+        self._calendar_fetches = 0
+        self._calendar_skips = 0
+        self._session_restored = False
+        self.api_version = None
+        self._session_valid_until = 0.0
+        self._token_expiry = {}
+        self._token_locks = {}
+        self._profile_context_digest = None
+        self._profile_context_expires = 0.0
+        self._guardian = None
+        self._children_built = False
+        self.apiurl = None
+        self._profiles = None
+        self._profilecontext = []
+        self._bearertoken = None
+        self.widgets = {}
+        self.tokens = {}
+        self.children = []
+        self.childnames = []
+        self.childnames_ = {}
+        self.institutions = {}
+        self._childuserids = []
+        self._childids = []
+        self._institutionprofiles = []
+        self.presence = {}
+        self.daily_overview = {}
+        self.unread_messages = 0
+        self.message = {}
+        self.huskeliste = {}
+        self.ugep_attr = {}
+        self.ugepnext_attr = {}
+        self.opg_attr = {}
+        self.opgnext_attr = {}
+        self.lessons = {}
+
+    @property
+    def _session(self) -> aiohttp.ClientSession | None:
+        """Aula session, shared with the other clients of the same user."""
+        return self._account.session
+
+    async def _request(self, method, url, session=None, **kwargs) -> Response:
+        """Send a request and read the whole response body."""
+        if session is None:
+            session = self._session
+        return await self._transport.request(session, method, url, **kwargs)
+
+    async def _aula_request(
+        self, method, uri, allow_status=(), csrf=False, probe=False, **kwargs
+    ) -> Response:
+        """Call the Aula API, logging in again once if the session has expired.
+
+        allow_status lists status codes that are a valid answer for this call
+        and must not be taken as an expired session. Only a rejected session
+        sends the request again, so a POST that failed for any other reason
+        is never repeated. A probe takes any status but OK as a rejected
+        session.
+        """
+        headers = kwargs.pop("headers", {})
+        for attempt in range(2):
+            generation = self._account.generation
+            if csrf:
+                headers = {**headers, "csrfp-token": self._csrf_token()}
+            response = await self._request(
+                method, self.apiurl + uri, headers=headers, **kwargs
+            )
+            if not _is_auth_failure(response, allow_status, probe):
+                self._session_valid_until = time.monotonic() + SESSION_TTL
+                return response
+            if attempt == 0:
+                _LOGGER.debug(
+                    f"Aula rejected {uri} with HTTP {response.status_code}, logging in again"  # noqa: G004
+                )
+                await self._async_relogin(generation)
+        return response
+
+    async def _async_relogin(self, generation):
+        """Log in again unless another caller already did since generation."""
+        async with self._account.lock:
+            if generation == self._account.generation:
+                await self.login()
 
-    def custom_api_call(self, uri, post_data):
+    async def _async_ensure_session(self):
+        """Make sure there is a session that Aula is likely to accept."""
+        if self._logged_in:
+            if time.monotonic() < self._session_valid_until:
+                return
+            # Not used for a while; log in again unless Aula answers OK.
+            await self._aula_request(
+                "GET", "?method=profiles.getProfilesByLogin", probe=True
+            )
+            return
+        async with self._account.lock:
+            if self._logged_in:
+                return
+            # Another client of the same user may already be logged in.
+            if self._account.generation and await self._async_adopt_session():
+                return
+            # A saved session is only worth trying right after startup.
+            restored = False
+            if not self._session_restored:
+                self._session_restored = True
+                restored = await self._async_restore_session()
+            if not restored:
+                await self.login()
+
+    def _csrf_token(self):
+        """Return the current Csrfp-Token cookie."""
+        for cookie in self._session.cookie_jar:
+            if cookie.key == "Csrfp-Token":
+                return cookie.value
+        return None
+
+    async def async_close(self):
+        """Cancel in-flight fetches and release the sessions."""
+        tasks = [task for task in self._tasks if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None and self._logged_in:
+            await self._async_save_session()
+        if self._fleet is None or self._fleet.release(self._username):
+            if self._session is not None:
+                # Sessions from async_create_clientsession share Home
+                # Assistant's connector; they are detached, not closed.
+                self._session.detach()
+                self._account.session = None
+        self._fleet = None
+        if self._widget_session is not None:
+            await self._widget_session.close()
+            self._widget_session = None
+        self._logged_in = False
+
+    async def custom_api_call(self, uri, post_data):
         """General Custom api call."""
-        csrf_token = self._session.cookies.get_dict()["Csrfp-Token"]
-        headers = {"csrfp-token": csrf_token, "content-type": "application/json"}
+        await self._async_ensure_session()
+        headers = {"content-type": "application/json"}
         _LOGGER.debug(f"custom_api_call: Making API call to {self.apiurl}{uri}")  # noqa: G004
         if post_data == 0:
-            response = self._session.get(
-                self.apiurl + uri, headers=headers, verify=True
-            )
+            response = await self._aula_request("GET", uri, headers=headers, csrf=True)
         else:
             try:
                 # Check if post_data is valid JSON
@@ -67,11 +408,12 @@ class Client:
                 error_msg = {"result": "Fail - invalid json supplied as post_data"}
                 return error_msg
             _LOGGER.debug(f"custom_api_call: post_data: {post_data}")  # noqa: G004
-            response = self._session.post(
-                self.apiurl + uri,
+            response = await self._aula_request(
+                "POST",
+                uri,
                 headers=headers,
+                csrf=True,
                 json=json.loads(post_data),
-                verify=True,
             )
         _LOGGER.debug(response.text)
         try:
@@ -80,10 +422,17 @@ class Client:
             res = {"raw_response": response.text}
         return res
 
-    def login(self):
+    async def login(self):
         """Login."""
         _LOGGER.debug("Logging in")
-        self._session = requests.Session()
+        self._logged_in = False
+        self._token_expiry = {}
+        if self._session is None:
+            self._account.session = async_create_clientsession(
+                self._hass, auto_cleanup=False
+            )
+        else:
+            self._session.cookie_jar.clear()
         headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/112.0",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
@@ -98,11 +447,11 @@ class Client:
         params = {
             "type": "unilogin",
         }
-        response = self._session.get(
+        response = await self._request(
+            "GET",
             "https://login.aula.dk/auth/login.php",
             params=params,
             headers=headers,
-            verify=True,
         )
 
         _html = BeautifulSoup(response.text, "lxml")
@@ -124,11 +473,11 @@ class Client:
         data = {
             "selectedIdp": "uni_idp",
         }
-        response = self._session.post(
+        response = await self._request(
+            "POST",
             _url,
             headers=headers,
             data=data,
-            verify=True,
         )
 
         user_data = {
@@ -151,26 +500,31 @@ class Client:
                         if input_.has_attr("name") and input_["name"] == key:
                             post_data[key] = user_data[key]
 
-            response = self._session.post(url, data=post_data, verify=True)
-            if response.url == "https://www.aula.dk:443/portal/":
+            response = await self._request("POST", url, data=post_data)
+            if _is_portal(response.url):
                 success = True
             redirects += 1
 
-        # Find the API url in case of a version change
-        self.apiurl = API + API_VERSION
-        apiver = int(API_VERSION)
+        # Find the API url in case of a version change. Start at the last
+        # version that worked, move up on HTTP 410 and only step down when
+        # that version does not exist (yet).
+        apiver = self.api_version or int(API_VERSION)
+        step = 0
         api_success = False
-        while api_success is False:
+        for _attempt in range(API_VERSION_ATTEMPTS):
+            self.apiurl = API + str(apiver)
             _LOGGER.debug(f"Trying API at {self.apiurl}")  # noqa: G004
-            ver = self._session.get(
-                self.apiurl + "?method=profiles.getProfilesByLogin", verify=True
+            ver = await self._request(
+                "GET", self.apiurl + "?method=profiles.getProfilesByLogin"
             )
             if ver.status_code == 410:
                 _LOGGER.debug(
                     f"API was expected at {self.apiurl} but responded with HTTP 410. The integration will automatically try a newer version and everything may work fine."  # noqa: G004
                 )
-                apiver += 1
-            if ver.status_code == 403:
+                if step < 0:
+                    break
+                step = 1
+            elif ver.status_code == 403:
                 msg = "Access to Aula API was denied. Please check that you have entered the correct credentials. (Your password automatically expires on regular intervals!)"
                 _LOGGER.error(msg)
                 raise ConfigEntryNotReady(msg)
@@ -179,60 +533,153 @@ class Client:
                 self._profiles = data["profiles"]
                 # _LOGGER.debug("self._profiles "+str(self._profiles))
                 api_success = True
-            self.apiurl = API + str(apiver)
+                break
+            else:
+                if step > 0 or apiver <= int(API_VERSION):
+                    break
+                _LOGGER.debug(
+                    f"API at {self.apiurl} responded with HTTP {ver.status_code}, trying an older version"  # noqa: G004
+                )
+                step = -1
+            apiver += step
+        if not api_success:
+            msg = f"Could not find a working Aula API, last tried {self.apiurl}"
+            _LOGGER.error(msg)
+            raise ConfigEntryNotReady(msg)
+        self.api_version = self._account.api_version = apiver
         _LOGGER.debug(f"Found API on {self.apiurl}")  # noqa: G004
         #
 
         # ver = self._session.get(self.apiurl + "?method=profiles.getProfilesByLogin", verify=True)
         # self._profiles = ver.json()["data"]["profiles"]
-        self._profilecontext = self._session.get(
-            self.apiurl + "?method=profiles.getProfileContext&portalrole=guardian",
-            verify=True,
-        ).json()["data"]["institutions"]  # ["institutionProfile"]["relations"]
+        await self._get_profile_context()
+        self._logged_in = True
+        self._account.generation += 1
+        self._session_valid_until = time.monotonic() + SESSION_TTL
+        await self._async_save_session()
         _LOGGER.debug(f"LOGIN: {str(success)}")  # noqa: G004
         _LOGGER.debug(
             f"Config - schoolschedule: {str(self._schoolschedule)}, config - ugeplaner: {str(self._ugeplan)}"  # noqa: G004
         )  # noqa: G004
 
-    def get_widgets(self):
-        """Widgets."""
-        detected_widgets = self._session.get(
-            self.apiurl + "?method=profiles.getProfileContext", verify=True
-        ).json()["data"]["moduleWidgetConfiguration"]["widgetConfigurations"]
+    async def _get_profile_context(self):
+        """Fetch the guardian profile context."""
+        response = await self._request(
+            "GET",
+            self.apiurl + "?method=profiles.getProfileContext&portalrole=guardian",
+        )
+        self._set_profile_context(response.json()["data"])
+
+    def _set_profile_context(self, data):
+        """Keep a profile context snapshot.
+
+        Institutions, children, widget configuration and the guardian userId
+        are all read from this snapshot instead of being fetched every cycle.
+        """
+        self._profile_context_expires = time.monotonic() + PROFILE_CONTEXT_TTL
+        digest = hashlib.sha1(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        if digest == self._profile_context_digest:
+            return
+        self._profile_context_digest = digest
+        self._profilecontext = data["institutions"]
+        self._guardian = data.get("userId")
+        self.widgets = {}
+        try:
+            widget_configuration = data["moduleWidgetConfiguration"]
+            detected_widgets = widget_configuration["widgetConfigurations"]
+        except (KeyError, TypeError):
+            detected_widgets = []
         for widget in detected_widgets:
-            widgetid = str(widget["widget"]["widgetId"])
-            widgetname = widget["widget"]["name"]
-            self.widgets[widgetid] = widgetname
+            self.widgets[str(widget["widget"]["widgetId"])] = widget["widget"]["name"]
         _LOGGER.debug(f"Widgets found: {str(self.widgets)}")  # noqa: G004
+        self._children_built = False
 
-    def get_token(self, widgetid, mock=False):
-        """Get Token."""
-        _LOGGER.debug(f"Requesting token for widget {widgetid}")  # noqa: G004
-        if mock:
-            return "MockToken"
-        self._bearertoken = self._session.get(
-            self.apiurl + "?method=aulaToken.getAulaToken&widgetId=" + widgetid,
-            verify=True,
-        ).json()["data"]
-        token = "Bearer " + str(self._bearertoken)
-        self.tokens[widgetid] = token
-        return token
+    async def _async_save_session(self):
+        """Save the session cookies so a restart can skip the login."""
+        if self._store is None:
+            return
+        cookies = [
+            {
+                "key": cookie.key,
+                "value": cookie.value,
+                "domain": cookie["domain"],
+                "path": cookie["path"],
+            }
+            for cookie in self._session.cookie_jar
+        ]
+        await self._store.async_save(
+            {"api_version": self.api_version, "cookies": cookies}
+        )
 
-    def update_data(self):  # noqa: C901
-        """Update data."""
-        is_logged_in = False
-        if self._session:
-            response = self._session.get(
-                self.apiurl + "?method=profiles.getProfilesByLogin", verify=True
-            ).json()
-            is_logged_in = response["status"]["message"] == "OK"
+    async def _async_restore_session(self):
+        """Reuse the saved session if Aula still accepts it."""
+        if self._store is None:
+            return False
+        data = await self._store.async_load()
+        if not data:
+            return False
+        if data.get("api_version"):
+            self.api_version = data["api_version"]
+        if not data.get("cookies") or self.api_version is None:
+            return False
+        _LOGGER.debug("Trying the saved Aula session")
+        if self._session is None:
+            self._account.session = async_create_clientsession(
+                self._hass, auto_cleanup=False
+            )
+        for saved in data["cookies"]:
+            if not saved["domain"]:
+                continue
+            cookie = SimpleCookie()
+            cookie[saved["key"]] = saved["value"]
+            cookie[saved["key"]]["domain"] = saved["domain"]
+            cookie[saved["key"]]["path"] = saved["path"] or "/"
+            self._session.cookie_jar.update_cookies(
+                cookie, URL("https://" + saved["domain"].lstrip(".") + "/")
+            )
+        if not await self._async_verify_session():
+            self._session.cookie_jar.clear()
+            return False
+        _LOGGER.debug("Reusing the saved Aula session")
+        self._account.api_version = self.api_version
+        self._account.generation += 1
+        return True
 
-        _LOGGER.debug(f"is_logged_in? {str(is_logged_in)}")  # noqa: G004
+    async def _async_adopt_session(self):
+        """Use the session another client of the same user logged in with."""
+        self.api_version = self._account.api_version
+        if not await self._async_verify_session():
+            return False
+        _LOGGER.debug("Sharing the Aula session of another config entry")
+        return True
 
-        if not is_logged_in:
-            self.login()
+    async def _async_verify_session(self):
+        """Check the session and fetch the profile context with it."""
+        self.apiurl = API + str(self.api_version)
+        try:
+            response = await self._request(
+                "GET", self.apiurl + "?method=profiles.getProfilesByLogin"
+            )
+            if (
+                response.status_code != 200
+                or response.json()["status"]["message"] != "OK"
+            ):
+                raise ValueError(response.status_code)
+            self._profiles = response.json()["data"]["profiles"]
+            await self._get_profile_context()
+        except (aiohttp.ClientError, ValueError, KeyError, TypeError) as err:
+            _LOGGER.debug(f"The Aula session is no longer valid: {err}")  # noqa: G004
+            return False
+        self._logged_in = True
+        self._session_valid_until = time.monotonic() + SESSION_TTL
+        return True
 
+    def _build_children(self):
+        """Build the child and institution maps from the profile context."""
         self.childnames_ = {}
+        self.childnames = []
         self.institutions = {}
         self._childuserids = []
         self._childids = []
@@ -247,33 +694,276 @@ class Client:
                 self._childids.append(str(child["id"]))
                 self._childuserids.append(str(child["userId"]))
             self._institutionprofiles.append(institutions["institutionCode"])
+        self._children_built = True
         _LOGGER.debug(f"Child ids and names: {str(self.childnames_)}")  # noqa: G004
         _LOGGER.debug(f"Child ids and institution names: {str(self.institutions)}")  # noqa: G004
         _LOGGER.debug(f"Institution codes: {str(self._institutionprofiles)}")  # noqa: G004
 
+    def anonymization(self):
+        """Replacements that take known personal data out of recorded traffic.
+
+        These are the credentials, the guardian's user id and the names of
+        the children and their institutions. Other names and free text are
+        scrubbed by the cassette itself.
+        """
+        replacements = {self._username: "user", self._password: "pass"}
+        if self._guardian:
+            replacements[self._guardian] = "guardian"
+        for i, (childid, name) in enumerate(self.childnames_.items()):
+            first, *rest = name.split()
+            replacements[first] = f"Barn{i}"
+            for part in rest:
+                replacements.setdefault(part, "Efternavn")
+            if childid in self.institutions:
+                replacements.setdefault(self.institutions[childid], f"Skole {i}")
+        return replacements
+
+    def request_stats(self):
+        """Request count, sizes and latency per endpoint."""
+        return self._transport.stats_diagnostics()
+
+    def diagnostics(self):
+        """Return client state for the diagnostics download."""
+        return {
+            "api_version": self.api_version,
+            "logged_in": self._logged_in,
+            "shared_session": self._account.clients > 1,
+            "hosts": self._transport.diagnostics(),
+            "endpoints": self.request_stats(),
+            "calendar": {
+                "weeks": [str(week) for week in self._calendar_windows],
+                "fetches": self._calendar_fetches,
+                "unchanged": self._calendar_skips,
+            },
+            "ugeplan": {
+                "cached": len(self._ugeplan_cache or {}),
+                "fetches": self._ugeplan_fetches,
+                "hits": self._ugeplan_hits,
+            },
+        }
+
+    async def get_token(self, widgetid):
+        """Get Token.
+
+        Tokens are cached per widget until shortly before they expire.
+        """
+        if time.time() < self._token_expiry.get(widgetid, 0):
+            return self.tokens[widgetid]
+        lock = self._token_locks.setdefault(widgetid, asyncio.Lock())
+        async with lock:
+            # Another caller may have fetched it while we waited.
+            if time.time() < self._token_expiry.get(widgetid, 0):
+                return self.tokens[widgetid]
+            _LOGGER.debug(f"Requesting token for widget {widgetid}")  # noqa: G004
+            self._bearertoken = (
+                await self._aula_request(
+                    "GET", "?method=aulaToken.getAulaToken&widgetId=" + widgetid
+                )
+            ).json()["data"]
+            token = "Bearer " + str(self._bearertoken)
+            self.tokens[widgetid] = token
+            self._token_expiry[widgetid] = _token_expiry(str(self._bearertoken))
+        return token
+
+    def invalidate_token(self, widgetid):
+        """Forget the cached token for a widget."""
+        self._token_expiry.pop(widgetid, None)
+
+    def _get_widget_session(self) -> aiohttp.ClientSession:
+        """Session for the widget providers, kept open across refreshes.
+
+        The providers authenticate with bearer tokens, so no cookies are kept.
+        """
+        if self._widget_session is None or self._widget_session.closed:
+            if self._fleet is not None:
+                connector = self._fleet.connector()
+            else:
+                connector = aiohttp.TCPConnector(
+                    ssl=client_context(),
+                    limit_per_host=self._widget_connections,
+                    keepalive_timeout=WIDGET_KEEPALIVE,
+                    ttl_dns_cache=DNS_CACHE_TTL,
+                )
+            self._widget_session = aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=self._fleet is None,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=WIDGET_TIMEOUT,
+            )
+        return self._widget_session
+
+    async def _widget_request(
+        self, widgetid, url, headers, auth_header="Authorization"
+    ) -> Response:
+        """GET from a widget provider, refreshing the token once on HTTP 401.
+
+        Raises WidgetError unless the provider answers with a 2xx status.
+        """
+        for attempt in range(2):
+            token = await self.get_token(widgetid)
+            # The connection pool may be shared, so the connections of this
+            # client are bounded here.
+            async with self._widget_slots:
+                response = await self._request(
+                    "GET",
+                    url,
+                    session=self._get_widget_session(),
+                    headers={**headers, auth_header: token},
+                )
+            if response.status_code != 401 or attempt == 1:
+                break
+            _LOGGER.debug(
+                f"Widget {widgetid} rejected its token, requesting a new one"  # noqa: G004
+            )
+            self.invalidate_token(widgetid)
+        if not 200 <= response.status_code < 300:
+            raise WidgetError(
+                f"Widget {widgetid} answered with HTTP {response.status_code}"
+            )
+        return response
+
+    async def _get_thread_messages(self, semaphore, threadid):
+        """Fetch one message thread and return its unread messages."""
+        async with semaphore:
+            # A 403 here means the thread needs MitID, not that the session
+            # has expired.
+            threadres = await self._aula_request(
+                "GET",
+                "?method=messaging.getMessagesForThread&threadId="
+                + str(threadid)
+                + "&page=0",
+                allow_status=(403,),
+            )
+        # _LOGGER.debug("threadres "+str(threadres.text))
+        thread = threadres.json()
+        messages = []
+        if thread["status"]["code"] == 403:
+            vals = {}
+
+            vals["text"] = "Log ind på Aula med MitID for at læse denne besked."
+            vals["sender"] = "Ukendt afsender"
+            vals["subject"] = "Følsom besked"
+            messages.append(vals)
+            return messages
+        for message in thread["data"]["messages"]:
+            if (
+                message["messageType"] == "Message"
+                or message["messageType"] == "MessageEdited"
+            ):
+                vals = {}
+                try:
+                    vals["text"] = message["text"]["html"]
+                except:  # noqa: E722
+                    try:
+                        vals["text"] = message["text"]
+                    except:  # noqa: E722
+                        vals["text"] = "intet indhold..."
+                        _LOGGER.warning(
+                            "There is an unread message, but we cannot get the text"
+                        )
+                try:
+                    vals["sender"] = message["sender"]["fullName"]
+                except:  # noqa: E722
+                    vals["sender"] = "Ukendt afsender"
+                try:
+                    vals["subject"] = message["subject"] = thread["data"]["subject"]
+                except:  # noqa: E722
+                    vals["subject"] = ""
+                messages.append(vals)
+        return messages
+
+    async def _run(self, *sections):
+        """Run update sections.
+
+        The running task is tracked so async_close can cancel it on unload.
+        """
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._async_prepare()
+            for section in sections:
+                await section()
+        finally:
+            self._tasks.discard(task)
+        return True
+
+    async def update_data(self):
+        """Update data."""
+        return await self._run(
+            self._update_presence,
+            self._update_messages,
+            self._update_calendar,
+            self._update_ugeplan,
+        )
+
+    async def update_presence(self):
+        """Update presence."""
+        return await self._run(self._update_presence)
+
+    async def update_messages(self):
+        """Update unread messages."""
+        return await self._run(self._update_messages)
+
+    async def update_calendar(self):
+        """Update the school schedules.
+
+        Returns a number that only changes when the lessons did.
+        """
+        await self._run(self._update_calendar)
+        return self._calendar_generation
+
+    async def update_ugeplan(self):
+        """Update ugeplaner, opgaver and Huskelisten."""
+        return await self._run(self._update_ugeplan)
+
+    async def _async_prepare(self):
+        """Make sure the session and the child maps are ready."""
+        await self._async_ensure_session()
+
+        if time.monotonic() >= self._profile_context_expires:
+            response = await self._aula_request(
+                "GET", "?method=profiles.getProfileContext&portalrole=guardian"
+            )
+            self._set_profile_context(response.json()["data"])
+        if not self._children_built:
+            self._build_children()
+
+    async def _update_presence(self):
+        """Fetch the daily overview of all children."""
         self.daily_overview = {}
-        for _i, child in enumerate(self.children):
-            response = self._session.get(
-                self.apiurl
-                + "?method=presence.getDailyOverview&childIds[]="
-                + str(child["id"]),
-                verify=True,
+        overviews = {}
+        if self._childids:
+            # One request for all children, split on the institution profile id.
+            response = (
+                await self._aula_request(
+                    "GET",
+                    "?method=presence.getDailyOverview&childIds[]="
+                    + "&childIds[]=".join(self._childids),
+                )
             ).json()
-            if len(response["data"]) > 0:
+            for overview in response["data"] or []:
+                try:
+                    overviews[str(overview["institutionProfile"]["id"])] = overview
+                except (KeyError, TypeError):
+                    _LOGGER.debug(
+                        f"Presence data without an institution profile id: {str(overview)}"  # noqa: G004
+                    )
+        for _i, child in enumerate(self.children):
+            if str(child["id"]) in overviews:
                 self.presence[str(child["id"])] = 1
-                self.daily_overview[str(child["id"])] = response["data"][0]
+                self.daily_overview[str(child["id"])] = overviews[str(child["id"])]
             else:
                 _LOGGER.debug(
-                    f"Unable to retrieve presence data from Aula from child with id {str(child["id"])}. Some data will be missing from sensor entities."  # noqa: G004
+                    f"Unable to retrieve presence data from Aula from child with id {str(child['id'])}. Some data will be missing from sensor entities."  # noqa: G004
                 )
                 self.presence[str(child["id"])] = 0
         _LOGGER.debug(f"Child ids and presence data status: {str(self.presence)}")  # noqa: G004
 
-        # Messages:
-        mesres = self._session.get(
-            self.apiurl
-            + "?method=messaging.getThreads&sortOn=date&orderDirection=desc&page=0",
-            verify=True,
+    async def _update_messages(self):
+        """Fetch unread message threads."""
+        mesres = await self._aula_request(
+            "GET",
+            "?method=messaging.getThreads&sortOn=date&orderDirection=desc&page=0",
         )
         # _LOGGER.debug("mesres "+str(mesres.text))
         self.unread_messages = 0
@@ -282,6 +972,7 @@ class Client:
         unread = 0
         message_count = 0
         threadid = []
+        stamps = {}
         messages = {}
         messages["message"] = []
 
@@ -291,109 +982,199 @@ class Client:
                 # self.unread_messages = 1
                 message_count = message_count + 1
                 threadid.append(mes["id"])
+                stamps[mes["id"]] = _thread_stamp(mes)
                 # threadid = mes["id"]
                 # if unread >= max_messages:
                 #    break
+        # Threads that are no longer unread will not be shown again.
+        for ids in list(self._thread_cache):
+            if ids not in stamps:
+                del self._thread_cache[ids]
         # if self.unread_messages == 1:
         if message_count > 0:
             # _LOGGER.debug("tid "+str(threadid))
-            for ids in threadid:
-                threadres = self._session.get(
-                    self.apiurl
-                    + "?method=messaging.getMessagesForThread&threadId="
-                    + str(ids)
-                    + "&page=0",
-                    verify=True,
+            semaphore = asyncio.Semaphore(self._message_concurrency)
+            pending = threadid
+            while len(pending) > 0 and unread < max_messages:
+                # Never fetch more threads than there is room for messages.
+                batch = pending[: max_messages - unread]
+                pending = pending[len(batch) :]
+                # Only threads that are new or have a newer latest message
+                # are fetched, the rest are served from the cache.
+                changed = [
+                    ids
+                    for ids in batch
+                    if stamps[ids] is None
+                    or self._thread_cache.get(ids, (None,))[0] != stamps[ids]
+                ]
+                results = await asyncio.gather(
+                    *[self._get_thread_messages(semaphore, ids) for ids in changed]
                 )
-                # _LOGGER.debug("threadres "+str(threadres.text))
-                if threadres.json()["status"]["code"] == 403:
-                    vals = {}
-
-                    vals["text"] = "Log ind på Aula med MitID for at læse denne besked."
-                    vals["sender"] = "Ukendt afsender"
-                    vals["subject"] = "Følsom besked"
-                    messages["message"].append(vals)
-                    unread = unread + 1
-                else:
-                    for message in threadres.json()["data"]["messages"]:
-                        if (
-                            message["messageType"] == "Message"
-                            or message["messageType"] == "MessageEdited"
-                        ):
-                            vals = {}
-                            try:
-                                vals["text"] = message["text"]["html"]
-                            except:  # noqa: E722
-                                try:
-                                    vals["text"] = message["text"]
-                                except:  # noqa: E722
-                                    vals["text"] = "intet indhold..."
-                                    _LOGGER.warning(
-                                        "There is an unread message, but we cannot get the text"
-                                    )
-                            try:
-                                vals["sender"] = message["sender"]["fullName"]
-                            except:  # noqa: E722
-                                vals["sender"] = "Ukendt afsender"
-                            try:
-                                vals["subject"] = message["subject"] = threadres.json()[
-                                    "data"
-                                ]["subject"]
-                            except:  # noqa: E722
-                                vals["subject"] = ""
-                            unread = unread + 1
-                            messages["message"].append(vals)
-
-                self.unread_messages = unread
-                if unread >= max_messages:
-                    break
+                for ids, thread_messages in zip(changed, results, strict=True):
+                    self._thread_cache[ids] = (stamps[ids], thread_messages)
+                _LOGGER.debug(
+                    f"Fetched {len(changed)} of {len(batch)} unread threads"  # noqa: G004
+                )
+                for ids in batch:
+                    thread_messages = self._thread_cache[ids][1]
+                    messages["message"].extend(thread_messages)
+                    unread = unread + len(thread_messages)
+                    self.unread_messages = unread
+                    if unread >= max_messages:
+                        break
         self.message = messages
-        # Calendar:
+
+    async def _update_calendar(self):
+        """Refresh the school schedule of this week and, if stale, next week."""
         if self._schoolschedule is True:
-            instProfileIds = ",".join(self._childids)
-            csrf_token = self._session.cookies.get_dict()["Csrfp-Token"]
-            headers = {"csrfp-token": csrf_token, "content-type": "application/json"}
-            start = datetime.datetime.now(datetime.UTC).strftime(
-                "%Y-%m-%d 00:00:00.0000%z"
+            if self._calendar_records is None:
+                await self._async_load_lessons()
+            week = _calendar_week(datetime.datetime.now(datetime.UTC))
+            changed = await self._async_refresh_week(week, ttl=0)
+            changed |= await self._async_refresh_week(
+                week + datetime.timedelta(weeks=1)
             )
-            _end = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=14)
-            end = _end.strftime("%Y-%m-%d 00:00:00.0000%z")
-            post_data = (
-                '{"instProfileIds":['
-                + instProfileIds
-                + '],"resourceIds":[],"start":"'
-                + start
-                + '","end":"'
-                + end
-                + '"}'
+            if changed:
+                self._rebuild_lessons()
+                await self._async_save_lessons()
+
+    async def async_get_lessons(self, childid, start, end):
+        """Lessons of a child between start and end, fetching missing weeks."""
+        weeks = []
+        week = _calendar_week(start)
+        while len(weeks) < CALENDAR_WINDOWS and _week_start(week) < end:
+            weeks.append(week)
+            week += datetime.timedelta(weeks=1)
+        # The weeks of this request are kept until its lessons are read.
+        self._weeks_in_use.update(weeks)
+        try:
+            changed = await self._async_refresh_weeks(weeks)
+            if changed:
+                self._rebuild_lessons()
+            index = self.lessons.get(childid)
+            lessons = index.between(start, end) if index is not None else []
+        finally:
+            for week in weeks:
+                self._weeks_in_use[week] -= 1
+                if not self._weeks_in_use[week]:
+                    del self._weeks_in_use[week]
+        if changed:
+            await self._async_save_lessons()
+        return lessons
+
+    async def _async_refresh_weeks(self, weeks) -> bool:
+        """Refresh several weeks at once. True if any of them changed."""
+        try:
+            changed = await asyncio.gather(
+                *(self._async_refresh_week(week) for week in weeks)
             )
-            _LOGGER.debug("Fetching calendars")
-            # _LOGGER.debug("Calendar post-data: "+str(post_data))
-            res = self._session.post(
-                self.apiurl + "?method=calendar.getEventsByProfileIdsAndResourceIds",
-                data=post_data,
-                headers=headers,
-                verify=True,
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.warning("Could not fetch the school schedules", exc_info=True)
+            return True
+        return any(changed)
+
+    async def _async_refresh_week(self, week, ttl=CALENDAR_WINDOW_TTL) -> bool:
+        """Fetch a week unless it was fetched within ttl. True if it was."""
+        lock = self._window_locks.setdefault(week, asyncio.Lock())
+        async with lock:
+            window = self._calendar_windows.get(week)
+            if window is not None and time.monotonic() - window[0] < ttl:
+                self._calendar_windows.move_to_end(week)
+                return False
+            return await self._fetch_week(week)
+
+    async def _fetch_week(self, week) -> bool:
+        """Fetch the lessons of all children in one week."""
+        start = _week_start(week)
+        end = start + datetime.timedelta(weeks=1)
+        post_data = json.dumps(
+            {
+                "instProfileIds": [int(childid) for childid in self._childids],
+                "resourceIds": [],
+                "start": start.strftime("%Y-%m-%d 00:00:00.0000%z"),
+                "end": end.strftime("%Y-%m-%d 00:00:00.0000%z"),
+            }
+        )
+        _LOGGER.debug(f"Fetching calendars for the week of {str(week)}")  # noqa: G004
+        res = await self._aula_request(
+            "POST",
+            "?method=calendar.getEventsByProfileIdsAndResourceIds",
+            data=post_data,
+            headers={"content-type": "application/json"},
+            csrf=True,
+        )
+        self._calendar_fetches += 1
+        digest = hashlib.sha1(res.text.encode()).hexdigest()
+        window = self._calendar_windows.get(week)
+        if window is not None and window[1] == digest:
+            # Same answer as last time; keep the parsed lessons.
+            self._calendar_skips += 1
+            self._calendar_windows[week] = (time.monotonic(), digest, window[2])
+            self._calendar_windows.move_to_end(week)
+            return False
+        try:
+            lessons = parse_lessons(res.json()["data"])
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.warning(
+                f"Got the following reply when trying to fetch calendars: {str(res.text)}"  # noqa: G004
             )
-            try:
-                with open("skoleskema.json", "w", encoding="utf-8") as skoleskema_json:
-                    json.dump(res.text, skoleskema_json)
-            except Exception:  # pylint: disable=broad-except
-                _LOGGER.warningn(
-                    f"Got the following reply when trying to fetch calendars: {str(res.text)}"
-                )
-        # End of calendar
+            return False
+        self._calendar_windows[week] = (time.monotonic(), digest, lessons)
+        self._calendar_windows.move_to_end(week)
+        self._evict_weeks()
+        return True
 
-        # Ugeplaner:
+    def _evict_weeks(self):
+        """Drop the least recently used weeks beyond CALENDAR_WINDOWS.
+
+        The current and the next week back the calendar entities, and weeks
+        of a running calendar request are about to be read, so those are
+        never dropped.
+        """
+        this_week = _calendar_week(datetime.datetime.now(datetime.UTC))
+        pinned = {this_week, this_week + datetime.timedelta(weeks=1)}
+        pinned.update(self._weeks_in_use)
+        excess = len(self._calendar_windows) - CALENDAR_WINDOWS
+        for week in [week for week in self._calendar_windows if week not in pinned]:
+            if excess <= 0:
+                break
+            del self._calendar_windows[week]
+            lock = self._window_locks.get(week)
+            if lock is not None and not lock.locked():
+                del self._window_locks[week]
+            excess -= 1
+
+    def _rebuild_lessons(self):
+        """Merge the cached weeks into one lesson index per child."""
+        merged = {}
+        for _fetched, _digest, lessons in self._calendar_windows.values():
+            for child, index in lessons.items():
+                merged.setdefault(child, []).extend(index.lessons)
+        self.lessons = {child: LessonIndex(events) for child, events in merged.items()}
+        self._calendar_generation += 1
+
+    async def _async_load_lessons(self):
+        """Load the school schedules stored by the last run."""
+        self._calendar_records = {}
+        if self._calendar_store is None:
+            return
+        records = await self._calendar_store.async_load()
+        if records:
+            self._calendar_records = records
+            self.lessons = lessons_from_records(records)
+
+    async def _async_save_lessons(self):
+        """Store the school schedules, if they changed since the last save."""
+        records = lessons_to_records(self.lessons)
+        if records == self._calendar_records:
+            return
+        self._calendar_records = records
+        if self._calendar_store is not None:
+            await self._calendar_store.async_save(records)
+
+    async def _update_ugeplan(self):
+        """Fetch ugeplaner from the widget providers."""
         if self._ugeplan is True:
-            guardian = self._session.get(
-                self.apiurl + "?method=profiles.getProfileContext&portalrole=guardian",
-                verify=True,
-            ).json()["data"]["userId"]
-            childUserIds = ",".join(self._childuserids)
-
-            if len(self.widgets) == 0:
-                self.get_widgets()
             if (
                 "0029" not in self.widgets
                 and "0004" not in self.widgets
@@ -407,258 +1188,283 @@ class Client:
                     "Multiple sources for ugeplaner is untested and might cause problems"
                 )
 
-            def ugeplan(week, thisnext):  # noqa: C901
-                """Ugeplan."""
+            now = datetime.datetime.now() + datetime.timedelta(weeks=1)
+            weeks = {
+                "this": datetime.datetime.now().strftime("%Y-W%W"),
+                "next": now.strftime("%Y-W%W"),
+            }
+            # Every provider and week is fetched at once, then merged in a
+            # fixed order so the result does not depend on which answers first.
+            jobs = []
+            for thisnext, week in weeks.items():
                 if "0030" in self.widgets:
-                    token = self.get_token("0030")
-                    institutions = str(self._institutionprofiles)
-                    get_payload = (
-                        "/opgaveliste?placement=full&sessionUUID="
-                        + guardian
-                        + "&userProfile=guardian&currentWeekNumber="
-                        + week
-                        + "&childFilter="
-                        + childUserIds
-                        + "&isMobileApp=false&institutionFilter="
-                        + institutions
-                    )
-                    opgaver_resp = requests.get(
-                        MIN_UDDANNELSE_API + get_payload,
-                        headers={"Authorization": token, "accept": "application/json"},
-                        verify=True,
-                        timeout=20,
-                    )
-                    # _LOGGER.debug("ugeplaner status_code "+str(ugeplaner.status_code))
-                    # _LOGGER.debug("ugeplaner response "+str(ugeplaner.text))
-                    if thisnext == "this":
-                        self.opg_attr = {}
-                    else:
-                        self.opgnext_attr = {}
-                    navne = []
-                    dage = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag"]
-                    for navn in self.childnames:
-                        if navn not in navne:
-                            navne.append(navn)
-                            if thisnext == "this":
-                                self.opg_attr[navn] = {}
-                                for dag in dage:
-                                    self.opg_attr[navn][dag] = []
-                            else:
-                                self.opgnext_attr[navn] = {}
-                                for dag in dage:
-                                    self.opgnext_attr[navn][dag] = []
-
-                    for opgave in opgaver_resp.json()["opgaver"]:
-                        kuvertnavn = opgave["kuvertnavn"]
-                        navn = kuvertnavn.split()[0]
-                        ugedag = opgave["ugedag"]
-                        vals = {}
-                        if len(opgave["hold"]) > 0:
-                            vals["hold_navn"] = opgave["hold"][0]["navn"]
-                        vals["title"] = opgave["title"].replace("'", "'")
-                        vals["erFaerdig"] = opgave["erFaerdig"]
-                        vals["opgaveType"] = opgave["opgaveType"]
-                        ad = opgave["afleveringsdato"][6:16]
-                        vals["afleveringsdato"] = time.strftime(
-                            "%d-%m-%Y %H:%M", time.gmtime(int(ad))
-                        )
-                        vals["ugenummer"] = opgave["ugenummer"]
-                        # vals["url"] = opgave["url"]
-
-                        if thisnext == "this":
-                            self.opg_attr[navn][ugedag].append(vals)
-                        elif thisnext == "next":
-                            self.opgnext_attr[navn][ugedag].append(vals)
+                    jobs.append(("0030", thisnext, week, self._fetch_opgaver))
                 if "0029" in self.widgets:
-                    token = self.get_token("0029")
-                    get_payload = (
-                        "/ugebrev?assuranceLevel=2&childFilter="
-                        + childUserIds
-                        + "&currentWeekNumber="
-                        + week
-                        + "&isMobileApp=false&placement=narrow&sessionUUID="
-                        + guardian
-                        + "&userProfile=guardian"
-                    )
-                    ugeplaner = requests.get(
-                        MIN_UDDANNELSE_API + get_payload,
-                        headers={"Authorization": token, "accept": "application/json"},
-                        verify=True,
-                        timeout=20,
-                    )
-                    # _LOGGER.debug("ugeplaner status_code "+str(ugeplaner.status_code))
-                    # _LOGGER.debug("ugeplaner response "+str(ugeplaner.text))
-                    for person in ugeplaner.json()["personer"]:
-                        ugeplan = person["institutioner"][0]["ugebreve"][0]["indhold"]
-                        if thisnext == "this":
-                            self.ugep_attr[person["navn"].split()[0]] = ugeplan
-                        elif thisnext == "next":
-                            self.ugepnext_attr[person["navn"].split()[0]] = ugeplan
-
-                if "0062" in self.widgets:
-                    _LOGGER.debug("In the Huskelisten flow")
-                    token = self.get_token("0062", False)
-                    huskelisten_headers = {
-                        "Accept": "application/json, text/plain, */*",
-                        "Accept-Encoding": "gzip, deflate, br",
-                        "Accept-Language": "en-US,en;q=0.9,da;q=0.8",
-                        "Aula-Authorization": token,
-                        "Origin": "https://www.aula.dk",
-                        "Referer": "https://www.aula.dk/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "cors",
-                        "Sec-Fetch-Site": "cross-site",
-                        "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 15183.51.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
-                        "zone": "Europe/Copenhagen",
-                    }
-
-                    children = "&children=".join(self._childuserids)
-                    institutions = "&institutions=".join(self._institutionprofiles)
-                    timedelta = datetime.datetime.now() + datetime.timedelta(days=180)
-                    From = datetime.datetime.now().strftime("%Y-%m-%d")
-                    dueNoLaterThan = timedelta.strftime("%Y-%m-%d")
-                    get_payload = (
-                        "/reminders/v1?children="
-                        + children
-                        + "&from="
-                        + From
-                        + "&dueNoLaterThan="
-                        + dueNoLaterThan
-                        + "&widgetVersion=1.10&userProfile=guardian&sessionId="
-                        + self._username
-                        + "&institutions="
-                        + institutions
-                    )
-                    _LOGGER.debug(
-                        f"Huskelisten get_payload: {SYSTEMATIC_API}{get_payload}"  # noqa: G004
-                    )
-                    #
-                    mock_huskelisten = 0
-                    #
-                    if mock_huskelisten == 1:
-                        _LOGGER.warning("Using mock data for Huskelisten")
-                        mock_huskelisten = '[{"userName":"Emilie efternavn","userId":164625,"courseReminders":[],"assignmentReminders":[],"teamReminders":[{"id":76169,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-29T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Onsdagslektie: Matematikfessor.dk: Sænk skibet med plus.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76598,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-06T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter Riis","subjectName":"Matematik"},{"id":76599,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-13T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter ","lastEditBy":"Peter ","subjectName":"Matematik"},{"id":76600,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-20T23:00:00Z","teamId":65240,"teamName":"2A","reminderText":"Julekalender på Skoledu.dk: I skal forsøge at løse dagens kalenderopgave. opgaven kan også godt løses dagen efter.","createdBy":"Peter Riis","lastEditBy":"Peter Riis","subjectName":"Matematik"}]},{"userName":"Karla","userId":77882,"courseReminders":[],"assignmentReminders":[{"id":0,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-12-08T11:00:00Z","courseId":297469,"teamNames":["5A","5B"],"teamIds":[65271,65258],"courseSubjects":[],"assignmentId":5027904,"assignmentText":"Skriv en novelle"}],"teamReminders":[{"id":76367,"institutionName":"Holme Skole","institutionId":183,"dueDate":"2022-11-30T23:00:00Z","teamId":65258,"teamName":"5A","reminderText":"Læse resten af kap.1 fra Ternet Ninja ( kopiark) Læs det hele højt eller vælg et afsnit. ","createdBy":"Christina ","lastEditBy":"Christina ","subjectName":"Dansk"}]},{"userName":"Vega  ","userId":206597,"courseReminders":[],"assignmentReminders":[],"teamReminders":[]}]'
-                        data = json.loads(mock_huskelisten, strict=False)
-                    else:
-                        response = requests.get(
-                            SYSTEMATIC_API + get_payload,
-                            headers=huskelisten_headers,
-                            verify=True,
-                            timeout=20,
-                        )
-                        try:
-                            data = json.loads(response.text, strict=False)
-                        except Exception:  # pylint: disable=broad-except
-                            _LOGGER.error(
-                                "Could not parse the response from Huskelisten as json"
-                            )
-                        # _LOGGER.debug("Huskelisten raw response: "+str(response.text))
-
-                    for person in data:
-                        name = person["userName"].split()[0]
-                        _LOGGER.debug(f"Huskelisten for {name}")  # noqa: G004
-                        huskel = ""
-                        reminders = person["teamReminders"]
-                        if len(reminders) > 0:
-                            for reminder in reminders:
-                                mytime = datetime.datetime.strptime(
-                                    reminder["dueDate"], "%Y-%m-%dT%H:%M:%SZ"
-                                )
-                                ftime = mytime.strftime("%A %d. %B")
-                                huskel = huskel + "<h3>" + ftime + "</h3>"
-                                huskel = (
-                                    huskel
-                                    + "<b>"
-                                    + reminder["subjectName"]
-                                    + "</b><br>"
-                                )
-                                huskel = (
-                                    huskel + "af " + reminder["createdBy"] + "<br><br>"
-                                )
-                                content = re.sub(
-                                    r"([0-9]+)(\.)", r"\1\.", reminder["reminderText"]
-                                )
-                                huskel = huskel + content + "<br><br>"
-                        else:
-                            huskel = huskel + str(name) + " har ingen påmindelser."
-                        self.huskeliste[name] = huskel
-
-                # End Huskelisten
+                    jobs.append(("0029", thisnext, week, self._fetch_ugebrev))
                 if "0004" in self.widgets:
-                    # Try Meebook:
-                    _LOGGER.debug("In the Meebook flow")
-                    token = self.get_token("0004")
-                    # _LOGGER.debug("Token "+token)
-                    headers = {
-                        "authority": "app.meebook.com",
-                        "accept": "application/json",
-                        "authorization": token,
-                        "dnt": "1",
-                        "origin": "https://www.aula.dk",
-                        "referer": "https://www.aula.dk/",
-                        "sessionuuid": self._username,
-                        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
-                        "x-version": "1.0",
-                    }
-                    childFilter = "&childFilter[]=".join(self._childuserids)
-                    institutionFilter = "&institutionFilter[]=".join(
-                        self._institutionprofiles
+                    jobs.append(("0004", thisnext, week, self._fetch_meebook))
+            if "0062" in self.widgets:
+                # Huskelisten covers the coming 180 days, not a single week.
+                today = datetime.date.today().isoformat()
+                jobs.append(("0062", None, today, self._fetch_huskeliste))
+
+            if self._ugeplan_cache is None:
+                await self._async_load_ugeplan_cache()
+            results = await asyncio.gather(
+                *(self._async_widget_data(*job) for job in jobs),
+                return_exceptions=True,
+            )
+            order = {"0030": 0, "0029": 1, "0062": 2, "0004": 3}
+            merge = {
+                "0030": self._merge_opgaver,
+                "0029": self._merge_ugebrev,
+                "0062": self._merge_huskeliste,
+                "0004": self._merge_meebook,
+            }
+            for (widget, thisnext, week, _fetch), data in sorted(
+                zip(jobs, results, strict=True),
+                key=lambda item: (item[0][1] != "this", order[item[0][0]]),
+            ):
+                if isinstance(data, Exception):
+                    _LOGGER.warning(
+                        f"Could not fetch widget {widget} for {thisnext} week: {data!r}"  # noqa: G004
                     )
-                    get_payload = (
-                        "/relatedweekplan/all?currentWeekNumber="
-                        + week
-                        + "&userProfile=guardian&childFilter[]="
-                        + childFilter
-                        + "&institutionFilter[]="
-                        + institutionFilter
+                    continue
+                # An answer of an unexpected shape only loses that widget.
+                try:
+                    merge[widget](data, thisnext)
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOGGER.warning(
+                        f"Could not read widget {widget} for {thisnext} week: {err!r}"  # noqa: G004
                     )
+                    # Fetch it again next time instead of serving it until
+                    # it expires.
+                    self._ugeplan_cache.pop(self._ugeplan_key(widget, week), None)
+                    self._async_save_ugeplan_cache()
+            # _LOGGER.debug("End result of ugeplan object: "+str(self.ugep_attr))
 
-                    mock_meebook = 0
-                    if mock_meebook == 1:
-                        _LOGGER.warning("Using mock data for Meebook ugeplaner")
-                        mock_meebook = '[{"id":490000,"name":"Emilie efternavn","unilogin":"lud...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"I denne uge er der omlagt uge p\u00e5 hele skolen.\n\nMandag har vi \nKlippeklistredag:\n\nMan m\u00e5 gerne have nissehuer p\u00e5 :)\n\nMedbring gerne en god saks, limstift, skabeloner mm. \n\nB\u00f8rnene skal ogs\u00e5 medbringe et vasket syltet\u00f8jsglas eller lign., som vi skal male p\u00e5. S\u00f8rg gerne for at der ikke er m\u00e6rker p\u00e5:-)\n\n1. lektion: Morgenb\u00e5nd med l\u00e6sning/opgaver\n\n2. lektion: \nVi laver f\u00e6lles julenisser efter en bestemt skabelon.\n\n3. - 5. lektion: \nVi julehygger med musik og kreative projekter. Vi pynter vores f\u00e6lles juletr\u00e6, og synger julesange. \n\n6. lektion:\nAfslutning og oprydning.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver.\n\n2. lektion\nVi starter p\u00e5 storylineforl\u00f8b om jul. Vi taler om nisser og danner nissefamilier i klassen.\n\n3.-5. lektion\nVi lave et juleprojekt med filt...\n\n6. lektion\nVi arbejder med en kreativ opgave om v\u00e5benskold.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. -2. lektion\nVi skal til foredrag med SOS B\u00f8rnebyerne om omvendt julekalender.\n\n3-4. lektion\nVi skriver nissehistorier om nissefamilierne.\n\n5.-6. lektion\nVi laver jule-postel\u00f8b, hvor posterne skal l\u00e6ses med en kodel\u00e6ser.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"Omlagt uge:\n\n1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver. \nVi arbejder med l\u00e6s og forst\u00e5 i en julehistorie.\n\n2.-5. lektion\nVi skal arbejde med et kreativt juleprojekt, hvor der laves huse til nisserne.\n\n6. lektion\nSe SOS b\u00f8rnebyernes julekalender og afrunding af dagen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3069630,"type":"comment","author":"Met...","group":"3.a - ugeplan","pill":"Ingen fag tilknyttet","content":"1. lektion\nMorgenb\u00e5nd med l\u00e6sning og opgaver samt julehygge, hvor vi l\u00e6ser julehistorie \n\n2. lektion:\nVi skal lave et julerim og skrive det ind p\u00e5 en flot julenisse samt tegne nissen. \n\n3.-4. lektion\nVi skal lave jule-postel\u00f8b p\u00e5 skolen. \n\n5.. lektion\nVi skal l\u00f8se et hemmeligt kodebrev ved hj\u00e6lp af en kodel\u00e6ser. \n\nVi evaluerer og afrunder ugen.","editUrl":"https://app.meebook.com//arsplaner/dlap//956783//202248"}]}]},{"id":630000,"name":"Ann...","unilogin":"ann...","weekPlan":[{"date":"mandag 28. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi h\u00f8re om jul i Norge og lave Norsk julepynt.\nEfter 12 pausen skal vi h\u00f8re om julen i Danmark f\u00f8r juletr\u00e6et og andestegen.\nVi skal farvel\u00e6gge g\u00e5rdnisserne der passede p\u00e5 g\u00e5rdene i gamle dage.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"tirsdag 29. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi arbejde med julen i Gr\u00f8nland og lave gr\u00f8nlandske julehuse.\nEfter 12 pausen skal vi h\u00f8re om JUletr\u00e6et der flytter ind i de danske stuer. Vi skal tale om hvor det stammer fra og hvad der var p\u00e5 juletr\u00e6et i gamle dage . Blandt andet den spiselige pynt.\nVi taler om Peters jul og at der ikke altid har v\u00e6ret en stjerne i toppen. Vi klipper storke til juletr\u00e6stoppen","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"onsdag 30. nov.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag st\u00e5r den p\u00e5 Jul i Finland og finske juletraditioner. Vi klipper finske julestjerner.\nEfter pausen skal vi arbejde videre med jul og julepynt gennem tiden i dk. \nVi skal tale om hvorfor der er flag, trompeter og trommer p\u00e5 tr\u00e6et (krigen i 1864) og vi skal lave gammeldags silkeroser og musetrapper til tr\u00e6et","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"torsdag 1. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"I dag skal vi p\u00e5 en juletur med hygge og posl\u00f8b til trylleskoven \nBussen k\u00f8rer os derud kl 10 og vi er senest tilbage n\u00e5r skoledagen slutter .\nHusk at f\u00e5 varmt praktisk t\u00f8j p\u00e5 og en turtaske med en let tilg\u00e6ngelig madpakke der kan spises i det fri. Regnbukser eller overtr\u00e6ksbukser s\u00e5 man kan sidde p\u00e5 jorden.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]},{"date":"fredag 2. dec.","tasks":[{"id":3090189,"type":"comment","author":"May...","group":"0C (22/23)","pill":"B\u00f8rnehaveklasse, B\u00f8rnehaveklassen, Dansk, Matematik","content":"Klippe/ klistre dag .\nHusk at tage lim, saks og kaffe m.m., kop og tallerkner med hjemmefra. Hvis i tager kage med er det til en buffet i klassen.","editUrl":"https://app.meebook.com//arsplaner/dlap//899210//202248"}]}]}]'
-                        data = json.loads(mock_meebook, strict=False)
-                    else:
-                        response = requests.get(
-                            MEEBOOK_API + get_payload,
-                            headers=headers,
-                            verify=True,
-                            timeout=20,
-                        )
-                        data = json.loads(response.text, strict=False)
-                        # _LOGGER.debug("Meebook ugeplan raw response from week "+week+": "+str(response.text))
-
-                    for person in data:
-                        _LOGGER.debug(f"Meebook ugeplan for {person["name"]}")  # noqa: G004
-                        ugep = ""
-                        ugeplan = person["weekPlan"]
-                        for day in ugeplan:
-                            ugep = ugep + "<h3>" + day["date"] + "</h3>"
-                            if len(day["tasks"]) > 0:
-                                for task in day["tasks"]:
-                                    if task["pill"] != "Ingen fag tilknyttet":
-                                        ugep = ugep + "<b>" + task["pill"] + "</b><br>"
-                                    ugep = ugep + task["author"] + "<br><br>"
-                                    content = re.sub(
-                                        r"([0-9]+)(\.)", r"\1\.", task["content"]
-                                    )
-                                    ugep = ugep + content + "<br><br>"
-                            else:
-                                ugep = ugep + "-"
-                        try:
-                            name = person["name"].split()[0]
-                        except Exception:  # pylint: disable=broad-except
-                            name = person["name"]
-                        if thisnext == "this":
-                            self.ugep_attr[name] = ugep
-                        elif thisnext == "next":
-                            self.ugepnext_attr[name] = ugep
+    async def _async_load_ugeplan_cache(self):
+        """Load the widget data stored by the last run."""
+        self._ugeplan_cache = {}
+        if self._ugeplan_store is not None:
+            self._ugeplan_cache = await self._ugeplan_store.async_load() or {}
 
-            now = datetime.datetime.now() + datetime.timedelta(weeks=1)
-            thisweek = datetime.datetime.now().strftime("%Y-W%W")
-            nextweek = now.strftime("%Y-W%W")
-            ugeplan(thisweek, "this")
-            ugeplan(nextweek, "next")
-            # _LOGGER.debug("End result of ugeplan object: "+str(self.ugep_attr))
-        # End of Ugeplaner
-        return True
+    def _ugeplan_key(self, widget, week):
+        """Cache key of the widget data of a week for these children."""
+        return f"{widget}:{week}:{','.join(sorted(self._childuserids))}"
+
+    async def _async_widget_data(self, widget, thisnext, week, fetch):
+        """Widget data for a week, from the cache while it is fresh.
+
+        Only answers of the expected shape are cached.
+        """
+        key = self._ugeplan_key(widget, week)
+        entry = self._ugeplan_cache.get(key)
+        if (
+            entry is not None
+            and _well_formed(widget, entry["data"])
+            and time.time() - entry["fetched"]
+            < _ugeplan_ttl(widget, thisnext, entry["data"]) - UGEPLAN_TTL_SLACK
+        ):
+            self._ugeplan_hits += 1
+            return entry["data"]
+        data = await fetch(week)
+        self._ugeplan_fetches += 1
+        if not _well_formed(widget, data):
+            raise WidgetError(f"Widget {widget} answered with unexpected data")
+        self._ugeplan_cache[key] = {"fetched": time.time(), "data": data}
+        self._async_save_ugeplan_cache()
+        return data
+
+    def _async_save_ugeplan_cache(self):
+        """Save the widget data a little later, batching changes."""
+        if self._ugeplan_store is not None:
+            self._ugeplan_store.async_delay_save(
+                self._ugeplan_cache_data, UGEPLAN_SAVE_DELAY
+            )
+
+    def _ugeplan_cache_data(self):
+        """Widget data to store, without entries nobody will ask for again."""
+        now = time.time()
+        self._ugeplan_cache = {
+            key: entry
+            for key, entry in self._ugeplan_cache.items()
+            if now - entry["fetched"] < UGEPLAN_MAX_AGE
+        }
+        return self._ugeplan_cache
+
+    async def _fetch_opgaver(self, week):
+        """Fetch the opgaver of a week from MinUddannelse."""
+        get_payload = (
+            "/opgaveliste?placement=full&sessionUUID="
+            + self._guardian
+            + "&userProfile=guardian&currentWeekNumber="
+            + week
+            + "&childFilter="
+            + ",".join(self._childuserids)
+            + "&isMobileApp=false&institutionFilter="
+            + str(self._institutionprofiles)
+        )
+        response = await self._widget_request(
+            "0030",
+            MIN_UDDANNELSE_API + get_payload,
+            {"accept": "application/json"},
+        )
+        return response.json()
+
+    def _merge_opgaver(self, data, thisnext):
+        """Sort the opgaver of a week by child and weekday."""
+        attr = {}
+        dage = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag"]
+        for navn in self.childnames:
+            if navn not in attr:
+                attr[navn] = {dag: [] for dag in dage}
+
+        for opgave in data["opgaver"]:
+            kuvertnavn = opgave["kuvertnavn"]
+            navn = kuvertnavn.split()[0]
+            ugedag = opgave["ugedag"]
+            vals = {}
+            if len(opgave["hold"]) > 0:
+                vals["hold_navn"] = opgave["hold"][0]["navn"]
+            vals["title"] = opgave["title"].replace("'", "'")
+            vals["erFaerdig"] = opgave["erFaerdig"]
+            vals["opgaveType"] = opgave["opgaveType"]
+            ad = opgave["afleveringsdato"][6:16]
+            vals["afleveringsdato"] = time.strftime(
+                "%d-%m-%Y %H:%M", time.gmtime(int(ad))
+            )
+            vals["ugenummer"] = opgave["ugenummer"]
+            # vals["url"] = opgave["url"]
+            attr[navn][ugedag].append(vals)
+        if thisnext == "this":
+            self.opg_attr = attr
+        else:
+            self.opgnext_attr = attr
+
+    async def _fetch_ugebrev(self, week):
+        """Fetch the ugebreve of a week from MinUddannelse."""
+        get_payload = (
+            "/ugebrev?assuranceLevel=2&childFilter="
+            + ",".join(self._childuserids)
+            + "&currentWeekNumber="
+            + week
+            + "&isMobileApp=false&placement=narrow&sessionUUID="
+            + self._guardian
+            + "&userProfile=guardian"
+        )
+        response = await self._widget_request(
+            "0029",
+            MIN_UDDANNELSE_API + get_payload,
+            {"accept": "application/json"},
+        )
+        return response.json()
+
+    def _merge_ugebrev(self, data, thisnext):
+        """Store the ugebrev of each child."""
+        attr = self.ugep_attr if thisnext == "this" else self.ugepnext_attr
+        for person in data["personer"]:
+            attr[person["navn"].split()[0]] = person["institutioner"][0]["ugebreve"][
+                0
+            ]["indhold"]
+
+    async def _fetch_huskeliste(self, day):
+        """Fetch reminders for the 180 days from day from Huskelisten."""
+        _LOGGER.debug("In the Huskelisten flow")
+        huskelisten_headers = {
+            "Accept": "application/json, text/plain, */*",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Language": "en-US,en;q=0.9,da;q=0.8",
+            "Origin": "https://www.aula.dk",
+            "Referer": "https://www.aula.dk/",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "cross-site",
+            "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 15183.51.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
+            "zone": "Europe/Copenhagen",
+        }
+
+        children = "&children=".join(self._childuserids)
+        institutions = "&institutions=".join(self._institutionprofiles)
+        timedelta = datetime.date.fromisoformat(day) + datetime.timedelta(days=180)
+        From = day
+        dueNoLaterThan = timedelta.strftime("%Y-%m-%d")
+        get_payload = (
+            "/reminders/v1?children="
+            + children
+            + "&from="
+            + From
+            + "&dueNoLaterThan="
+            + dueNoLaterThan
+            + "&widgetVersion=1.10&userProfile=guardian&sessionId="
+            + self._username
+            + "&institutions="
+            + institutions
+        )
+        _LOGGER.debug(
+            f"Huskelisten get_payload: {SYSTEMATIC_API}{get_payload}"  # noqa: G004
+        )
+        response = await self._widget_request(
+            "0062",
+            SYSTEMATIC_API + get_payload,
+            huskelisten_headers,
+            auth_header="Aula-Authorization",
+        )
+        # _LOGGER.debug("Huskelisten raw response: "+str(response.text))
+        try:
+            return json.loads(response.text, strict=False)
+        except ValueError as err:
+            raise WidgetError(
+                "Could not parse the response from Huskelisten as json"
+            ) from err
+
+    def _merge_huskeliste(self, data, _thisnext):
+        """Store the rendered Huskelisten of each child."""
+        for person in data:
+            name = person["userName"].split()[0]
+            _LOGGER.debug(f"Huskelisten for {name}")  # noqa: G004
+            self.huskeliste[name] = render_huskeliste(person)
+
+    async def _fetch_meebook(self, week):
+        """Fetch the week plans of a week from Meebook."""
+        _LOGGER.debug("In the Meebook flow")
+        headers = {
+            "authority": "app.meebook.com",
+            "accept": "application/json",
+            "dnt": "1",
+            "origin": "https://www.aula.dk",
+            "referer": "https://www.aula.dk/",
+            "sessionuuid": self._username,
+            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36",
+            "x-version": "1.0",
+        }
+        childFilter = "&childFilter[]=".join(self._childuserids)
+        institutionFilter = "&institutionFilter[]=".join(self._institutionprofiles)
+        get_payload = (
+            "/relatedweekplan/all?currentWeekNumber="
+            + week
+            + "&userProfile=guardian&childFilter[]="
+            + childFilter
+            + "&institutionFilter[]="
+            + institutionFilter
+        )
+
+        response = await self._widget_request(
+            "0004",
+            MEEBOOK_API + get_payload,
+            headers,
+            auth_header="authorization",
+        )
+        # _LOGGER.debug("Meebook ugeplan raw response from week "+week+": "+str(response.text))
+        return json.loads(response.text, strict=False)
+
+    def _merge_meebook(self, data, thisnext):
+        """Store the rendered Meebook week plan of each child."""
+        attr = self.ugep_attr if thisnext == "this" else self.ugepnext_attr
+        for person in data:
+            _LOGGER.debug(f"Meebook ugeplan for {person['name']}")  # noqa: G004
+            try:
+                name = person["name"].split()[0]
+            except Exception:  # pylint: disable=broad-except
+                name = person["name"]
+            attr[name] = render_meebook(person)
@@ -6,13 +6,30 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity_registry import (
     async_entries_for_config_entry,
     async_get,
 )
 
-from .const import CONF_SCHOOLSCHEDULE, CONF_UGEPLAN, DOMAIN
+from .const import (
+    CONF_CALENDAR_INTERVAL,
+    CONF_MESSAGE_CONCURRENCY,
+    CONF_MESSAGES_INTERVAL,
+    CONF_PRESENCE_INTERVAL,
+    CONF_SCHOOLSCHEDULE,
+    CONF_UGEPLAN,
+    CONF_UGEPLAN_INTERVAL,
+    CONF_WIDGET_CONNECTIONS,
+    DEFAULT_CALENDAR_INTERVAL,
+    DEFAULT_MESSAGE_CONCURRENCY,
+    DEFAULT_MESSAGES_INTERVAL,
+    DEFAULT_PRESENCE_INTERVAL,
+    DEFAULT_UGEPLAN_INTERVAL,
+    DEFAULT_WIDGET_CONNECTIONS,
+    DOMAIN,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -53,12 +70,47 @@ class AulaCustomConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="user", data_schema=AUTH_SCHEMA, errors=errors
         )
 
-
-# reconfiguration (options flow), to be implemented
-#    @staticmethod
-#    @callback
-#    def async_get_options_flow(config_entry):
-#        return OptionsFlowHandler(config_entry)
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow."""
+        return OptionsFlowHandler(config_entry)
+
+
+def options_schema(options):
+    """Options schema, defaulting to the current values."""
+
+    def interval(key, default):
+        return vol.Optional(key, default=options.get(key, default))
+
+    return vol.Schema(
+        {
+            vol.Optional(
+                CONF_SCHOOLSCHEDULE, default=options.get(CONF_SCHOOLSCHEDULE, False)
+            ): cv.boolean,
+            vol.Optional(
+                CONF_UGEPLAN, default=options.get(CONF_UGEPLAN, False)
+            ): cv.boolean,
+            interval(CONF_PRESENCE_INTERVAL, DEFAULT_PRESENCE_INTERVAL): vol.All(
+                vol.Coerce(int), vol.Range(min=1)
+            ),
+            interval(CONF_MESSAGES_INTERVAL, DEFAULT_MESSAGES_INTERVAL): vol.All(
+                vol.Coerce(int), vol.Range(min=1)
+            ),
+            interval(CONF_CALENDAR_INTERVAL, DEFAULT_CALENDAR_INTERVAL): vol.All(
+                vol.Coerce(int), vol.Range(min=5)
+            ),
+            interval(CONF_UGEPLAN_INTERVAL, DEFAULT_UGEPLAN_INTERVAL): vol.All(
+                vol.Coerce(int), vol.Range(min=5)
+            ),
+            interval(CONF_MESSAGE_CONCURRENCY, DEFAULT_MESSAGE_CONCURRENCY): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=16)
+            ),
+            interval(CONF_WIDGET_CONNECTIONS, DEFAULT_WIDGET_CONNECTIONS): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=16)
+            ),
+        }
+    )
 
 
 class OptionsFlowHandler(config_entries.OptionsFlow):
@@ -67,13 +119,15 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
     def __init__(self, config_entry) -> None:
         """Initialize HACS options flow."""
         self.config_entry = config_entry
-        self.options = dict(config_entry.options)
+        self.options = {**config_entry.data, **config_entry.options}
+        self.options.pop(CONF_USERNAME, None)
+        self.options.pop(CONF_PASSWORD, None)
 
     async def async_step_init(self, user_input=None):
         """Manage the options."""
         _LOGGER.debug("Options")
         _LOGGER.debug(self.config_entry)
-        entity_registry = await async_get(self.hass)
+        entity_registry = async_get(self.hass)
         entries = async_entries_for_config_entry(
             entity_registry, self.config_entry.entry_id
         )
@@ -92,7 +146,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
         return self.async_show_form(
             step_id="user",
-            data_schema=AUTH_SCHEMA,
+            data_schema=options_schema(self.options),
         )
 
     async def _update_options(self):
@@ -3,6 +3,7 @@
 STARTUP = "Aula"
 
 DOMAIN = "aula"
+STORAGE_VERSION = 1
 API = "https://www.aula.dk/api/v"
 API_VERSION = "18"
 MIN_UDDANNELSE_API = "https://api.minuddannelse.net/aula"
@@ -10,3 +11,20 @@ MEEBOOK_API = "https://app.meebook.com/aulaapi"
 SYSTEMATIC_API = "https://systematic-momo.dk/api/aula"
 CONF_SCHOOLSCHEDULE = "schoolschedule"
 CONF_UGEPLAN = "ugeplan"
+CONF_MESSAGE_CONCURRENCY = "message_concurrency"
+CONF_WIDGET_CONNECTIONS = "widget_connections"
+
+DEFAULT_MESSAGE_CONCURRENCY = 4
+DEFAULT_WIDGET_CONNECTIONS = 4
+CONF_PRESENCE_INTERVAL = "presence_interval"
+CONF_MESSAGES_INTERVAL = "messages_interval"
+CONF_CALENDAR_INTERVAL = "calendar_interval"
+CONF_UGEPLAN_INTERVAL = "ugeplan_interval"
+
+# Refresh intervals in minutes, per section. Ugeplaner are served from a
+# cache until they are due, so the short ugeplan interval mostly costs no
+# requests and picks up next week soon after it is published.
+DEFAULT_PRESENCE_INTERVAL = 1
+DEFAULT_MESSAGES_INTERVAL = 5
+DEFAULT_CALENDAR_INTERVAL = 30
+DEFAULT_UGEPLAN_INTERVAL = 15
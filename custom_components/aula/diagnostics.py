@@ -0,0 +1,25 @@
+"""Diagnostics."""
+from typing import Any
+
+from homeassistant import config_entries, core
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+
+from .const import DOMAIN
+from .fleet import DATA_FLEET
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    client = hass.data[DOMAIN].get(entry.entry_id, {}).get("client")
+    fleet = hass.data.get(DATA_FLEET)
+    return {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+        "client": client.diagnostics() if client is not None else None,
+        "fleet": fleet.diagnostics() if fleet is not None else None,
+    }
@@ -0,0 +1,103 @@
+"""Resources shared by all Aula accounts in one Home Assistant."""
+import asyncio
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util.ssl import client_context
+
+DATA_FLEET = "aula_fleet"
+# Requests in flight at once across all accounts, and connections to the
+# widget providers kept across all accounts.
+FLEET_REQUESTS = 16
+FLEET_WIDGET_CONNECTIONS = 32
+# Idle widget provider connections are kept open this long, and resolved
+# provider addresses are reused for DNS_CACHE_TTL.
+WIDGET_KEEPALIVE = 90
+DNS_CACHE_TTL = 5 * 60
+
+
+class Account:
+    """Aula session shared by the clients logged in as the same user."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.session: aiohttp.ClientSession | None = None
+        self.lock = asyncio.Lock()
+        # Bumped on every login, so callers can tell whether someone else
+        # already logged in again while they waited for the lock.
+        self.generation = 0
+        self.api_version = None
+        self.clients = 0
+
+
+class Fleet:
+    """Request budget, connection pool and sessions of all config entries."""
+
+    def __init__(
+        self, requests=FLEET_REQUESTS, connections=FLEET_WIDGET_CONNECTIONS
+    ) -> None:
+        """Init."""
+        self.requests = asyncio.Semaphore(requests)
+        self._connections = connections
+        self._connector: aiohttp.TCPConnector | None = None
+        self._accounts: dict[str, Account] = {}
+
+    def account(self, username) -> Account:
+        """Join the account of a user, creating it for the first client."""
+        account = self._accounts.setdefault(username, Account())
+        account.clients += 1
+        return account
+
+    def release(self, username) -> bool:
+        """Leave the account of a user; True if it has no clients left."""
+        account = self._accounts[username]
+        account.clients -= 1
+        if account.clients > 0:
+            return False
+        del self._accounts[username]
+        return True
+
+    @property
+    def in_use(self) -> bool:
+        """Return True while any client uses the fleet."""
+        return bool(self._accounts)
+
+    def connector(self) -> aiohttp.TCPConnector:
+        """Connection pool to the widget providers."""
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                ssl=client_context(),
+                limit=self._connections,
+                keepalive_timeout=WIDGET_KEEPALIVE,
+                ttl_dns_cache=DNS_CACHE_TTL,
+            )
+        return self._connector
+
+    def diagnostics(self):
+        """Accounts and clients sharing the fleet."""
+        return {
+            "accounts": len(self._accounts),
+            "clients": sum(account.clients for account in self._accounts.values()),
+        }
+
+    async def async_close(self):
+        """Close the connection pool."""
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+
+def async_get_fleet(hass: HomeAssistant) -> Fleet:
+    """Return the fleet of this Home Assistant, creating it if needed."""
+    if DATA_FLEET not in hass.data:
+        hass.data[DATA_FLEET] = Fleet()
+    return hass.data[DATA_FLEET]
+
+
+async def async_release_fleet(hass: HomeAssistant):
+    """Close the fleet once no config entry uses it any more."""
+    fleet: Fleet | None = hass.data.get(DATA_FLEET)
+    if fleet is not None and not fleet.in_use:
+        hass.data.pop(DATA_FLEET)
+        await fleet.async_close()
@@ -0,0 +1,78 @@
+"""HTML rendering of ugeplaner and Huskelisten."""
+from collections import OrderedDict
+import datetime
+import functools
+import hashlib
+import json
+import re
+
+# Numbered lines ("1. lektion") are escaped so the frontend's markdown
+# renderer does not turn them into lists.
+NUMBERED = re.compile(r"([0-9]+)(\.)")
+NO_SUBJECT = "Ingen fag tilknyttet"
+# Rendered persons kept per renderer, keyed by a hash of their input.
+MEMO_SIZE = 64
+
+
+def _memoized(render):
+    """Reuse the output of render for input it has already seen."""
+    memo: OrderedDict[bytes, str] = OrderedDict()
+
+    @functools.wraps(render)
+    def wrapper(person):
+        key = hashlib.sha1(
+            json.dumps(person, sort_keys=True, default=str).encode()
+        ).digest()
+        html = memo.get(key)
+        if html is None:
+            html = memo[key] = render(person)
+            if len(memo) > MEMO_SIZE:
+                memo.popitem(last=False)
+        else:
+            memo.move_to_end(key)
+        return html
+
+    return wrapper
+
+
+@_memoized
+def render_huskeliste(person) -> str:
+    """Render the team reminders of one child from Huskelisten."""
+    reminders = person["teamReminders"]
+    if not reminders:
+        return person["userName"].split()[0] + " har ingen påmindelser."
+    parts = []
+    for reminder in reminders:
+        due = datetime.datetime.strptime(reminder["dueDate"], "%Y-%m-%dT%H:%M:%SZ")
+        parts += [
+            "<h3>",
+            due.strftime("%A %d. %B"),
+            "</h3><b>",
+            reminder["subjectName"],
+            "</b><br>af ",
+            reminder["createdBy"],
+            "<br><br>",
+            NUMBERED.sub(r"\1\.", reminder["reminderText"]),
+            "<br><br>",
+        ]
+    return "".join(parts)
+
+
+@_memoized
+def render_meebook(person) -> str:
+    """Render the week plan of one child from Meebook."""
+    parts = []
+    for day in person["weekPlan"]:
+        parts += ["<h3>", day["date"], "</h3>"]
+        if not day["tasks"]:
+            parts.append("-")
+        for task in day["tasks"]:
+            if task["pill"] != NO_SUBJECT:
+                parts += ["<b>", task["pill"], "</b><br>"]
+            parts += [
+                task["author"],
+                "<br><br>",
+                NUMBERED.sub(r"\1\.", task["content"]),
+                "<br><br>",
+            ]
+    return "".join(parts)
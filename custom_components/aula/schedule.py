@@ -0,0 +1,105 @@
+"""School schedule parsing and lookup."""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import logging
+
+from homeassistant.components.calendar import CalendarEvent
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _teacher(lesson, summary, start):
+    """Teacher shown next to the lesson title."""
+    participants = lesson["lesson"]["participants"]
+    for p in participants:
+        if p["participantRole"] == "substituteTeacher":
+            return "VIKAR: " + p["teacherName"]
+    try:
+        return participants[0]["teacherInitials"]
+    except Exception:  # pylint: disable=broad-except
+        try:
+            _LOGGER.debug(f"Lesson json dump {str(lesson['lesson'])}")  # noqa: G004
+            return participants[0]["teacherName"]
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.debug(
+                f"Could not find any teacher information for {summary} at {str(start)}"  # noqa: G004
+            )
+            return ""
+
+
+class LessonIndex:
+    """Lessons of one child sorted by start time."""
+
+    def __init__(self, lessons: list[CalendarEvent]) -> None:
+        """Init."""
+        self.lessons = sorted(lessons, key=lambda lesson: lesson.start)
+        self._starts = [lesson.start for lesson in self.lessons]
+        # Any lesson overlapping a point starts at most this long before it.
+        self._max_duration = max(
+            (lesson.end - lesson.start for lesson in self.lessons),
+            default=timedelta(0),
+        )
+
+    def _first_ending_after(self, when: datetime) -> int:
+        """Position of the first lesson that ends after when."""
+        i = bisect_left(self._starts, when - self._max_duration)
+        while i < len(self.lessons) and self.lessons[i].end <= when:
+            i += 1
+        return i
+
+    def between(self, start: datetime, end: datetime) -> list[CalendarEvent]:
+        """Lessons overlapping the range from start to end."""
+        lo = bisect_left(self._starts, start - self._max_duration)
+        hi = bisect_left(self._starts, end)
+        return [lesson for lesson in self.lessons[lo:hi] if lesson.end > start]
+
+    def next_event(self, now: datetime) -> CalendarEvent | None:
+        """The current lesson, or the next one if none is running."""
+        i = self._first_ending_after(now)
+        if i < len(self.lessons):
+            return self.lessons[i]
+        return None
+
+
+def parse_lessons(data) -> dict[int, LessonIndex]:
+    """Parse a calendar response into indexed lessons per child id."""
+    lessons: dict[int, list[CalendarEvent]] = {}
+    for c in data:
+        if c["type"] != "lesson":
+            continue
+        summary = c["title"]
+        start = datetime.fromisoformat(c["startDateTime"])
+        end = datetime.fromisoformat(c["endDateTime"])
+        teacher = _teacher(c, summary, start)
+        lessons.setdefault(c["belongsToProfiles"][0], []).append(
+            CalendarEvent(summary=summary + ", " + teacher, start=start, end=end)
+        )
+    return {child: LessonIndex(events) for child, events in lessons.items()}
+
+
+def lessons_to_records(lessons: dict[int, LessonIndex]) -> dict[str, list]:
+    """Compact, json friendly form of the lessons for storage."""
+    return {
+        str(child): [
+            [lesson.start.isoformat(), lesson.end.isoformat(), lesson.summary]
+            for lesson in index.lessons
+        ]
+        for child, index in lessons.items()
+    }
+
+
+def lessons_from_records(records: dict[str, list]) -> dict[int, LessonIndex]:
+    """Rebuild the lessons from their stored records."""
+    return {
+        int(child): LessonIndex(
+            [
+                CalendarEvent(
+                    summary=summary,
+                    start=datetime.fromisoformat(start),
+                    end=datetime.fromisoformat(end),
+                )
+                for start, end, summary in rows
+            ]
+        )
+        for child, rows in records.items()
+    }
@@ -1,24 +1,50 @@
 """Sensors."""
 from datetime import datetime, timedelta
+import hashlib
 import json
 import logging
+import re
+from types import MappingProxyType
 
 import voluptuous as vol
 
 from homeassistant import config_entries, core
-from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    EntityCategory,
+    UnitOfTime,
+)
 from homeassistant.core import (
-    HomeAssistant,
     ServiceCall,
     ServiceResponse,
     SupportsResponse,
+    callback,
 )
+from homeassistant.exceptions import ServiceValidationError
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
 from .client import Client
-from .const import CONF_SCHOOLSCHEDULE, CONF_UGEPLAN, DOMAIN
+from .const import (
+    CONF_CALENDAR_INTERVAL,
+    CONF_MESSAGE_CONCURRENCY,
+    CONF_MESSAGES_INTERVAL,
+    CONF_PRESENCE_INTERVAL,
+    CONF_SCHOOLSCHEDULE,
+    CONF_UGEPLAN,
+    CONF_UGEPLAN_INTERVAL,
+    CONF_WIDGET_CONNECTIONS,
+    DEFAULT_CALENDAR_INTERVAL,
+    DEFAULT_MESSAGE_CONCURRENCY,
+    DEFAULT_MESSAGES_INTERVAL,
+    DEFAULT_PRESENCE_INTERVAL,
+    DEFAULT_UGEPLAN_INTERVAL,
+    DEFAULT_WIDGET_CONNECTIONS,
+    DOMAIN,
+)
+from .fleet import async_get_fleet
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,11 +54,63 @@ API_CALL_SCHEMA = vol.Schema(
     {
         vol.Required("uri"): cv.string,
         vol.Optional("post_data"): cv.string,
+        vol.Optional("config_entry_id"): cv.string,
     }
 )
 
 PARALLEL_UPDATES = 1
 
+# 0 = IKKE KOMMET
+# 1 = SYG
+# 2 = FERIE/FRI
+# 3 = KOMMET/TIL STEDE
+# 4 = PÅ TUR
+# 5 = SOVER
+# 8 = HENTET/GÅET
+PRESENCE_STATES = (
+    "Ikke kommet",
+    "Syg",
+    "Ferie/Fri",
+    "Kommet/Til stede",
+    "På tur",
+    "Sover",
+    "6",
+    "7",
+    "Gået",
+    "9",
+    "10",
+    "11",
+    "12",
+    "13",
+    "14",
+    "15",
+)
+PRESENCE_FIELDS = (
+    "location",
+    "sleepIntervals",
+    "checkInTime",
+    "checkOutTime",
+    "activityType",
+    "entryTime",
+    "exitTime",
+    "exitWith",
+    "comment",
+    "spareTimeActivity",
+    "selfDeciderStartTime",
+    "selfDeciderEndTime",
+)
+CLOCK = re.compile(r"(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d")
+
+
+def _hhmm(value):
+    """Shorten a HH:MM:SS time to HH:MM, leaving anything else as it is."""
+    if isinstance(value, str) and CLOCK.fullmatch(value):
+        return value[:5]
+    try:
+        return datetime.strptime(value, "%H:%M:%S").strftime("%H:%M")
+    except Exception:  # pylint: disable=broad-except
+        return value
+
 
 async def async_setup_entry(
     hass: core.HomeAssistant,
@@ -46,61 +124,140 @@ async def async_setup_entry(
         config.update(config_entry.options)
     # from .client import Client
     client = Client(
+        hass,
         config[CONF_USERNAME],
         config[CONF_PASSWORD],
         config[CONF_SCHOOLSCHEDULE],
         config[CONF_UGEPLAN],
+        config.get(CONF_MESSAGE_CONCURRENCY, DEFAULT_MESSAGE_CONCURRENCY),
+        config_entry.entry_id,
+        widget_connections=config.get(
+            CONF_WIDGET_CONNECTIONS, DEFAULT_WIDGET_CONNECTIONS
+        ),
+        fleet=async_get_fleet(hass),
     )
-    hass.data[DOMAIN]["client"] = client
+    config["client"] = client
 
-    async def async_update_data():
-        client = hass.data[DOMAIN]["client"]
-        await hass.async_add_executor_job(client.update_data)
+    def section_coordinator(section, update_method, interval, default, **kwargs):
+        return DataUpdateCoordinator(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {config_entry.title} {section}",
+            update_method=update_method,
+            update_interval=timedelta(minutes=config.get(interval, default)),
+            **kwargs,
+        )
 
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="sensor",
-        update_method=async_update_data,
-        update_interval=timedelta(minutes=5),
-    )
+    # Each section refreshes on its own schedule, so fast changing presence
+    # does not drag the slow calendar and ugeplan fetches along.
+    coordinators = {
+        "presence": section_coordinator(
+            "presence",
+            client.update_presence,
+            CONF_PRESENCE_INTERVAL,
+            DEFAULT_PRESENCE_INTERVAL,
+        ),
+        "messages": section_coordinator(
+            "messages",
+            client.update_messages,
+            CONF_MESSAGES_INTERVAL,
+            DEFAULT_MESSAGES_INTERVAL,
+        ),
+    }
+    if config[CONF_SCHOOLSCHEDULE]:
+        coordinators["calendar"] = section_coordinator(
+            "calendar",
+            client.update_calendar,
+            CONF_CALENDAR_INTERVAL,
+            DEFAULT_CALENDAR_INTERVAL,
+            # Calendars are only updated when the lessons changed.
+            always_update=False,
+        )
+    if config[CONF_UGEPLAN]:
+        coordinators["ugeplan"] = section_coordinator(
+            "ugeplan",
+            client.update_ugeplan,
+            CONF_UGEPLAN_INTERVAL,
+            DEFAULT_UGEPLAN_INTERVAL,
+        )
+    config["coordinators"] = coordinators
 
     # Immediate refresh
-    await coordinator.async_request_refresh()
+    await client.update_data()
 
     entities = []
-    client = hass.data[DOMAIN]["client"]
-    await hass.async_add_executor_job(client.update_data)
     for _i, child in enumerate(client.children):
         # _LOGGER.debug("Presence data for child "+str(child["id"])+" : "+str(client.presence[str(child["id"])]))
         if client.presence[str(child["id"])] == 1:
             if str(child["id"]) in client.daily_overview:
                 _LOGGER.debug(
-                    f"Found presence data for childid {str(child["id"])} adding sensor entity"  # noqa: G004
+                    f"Found presence data for childid {str(child['id'])} adding sensor entity"  # noqa: G004
+                )
+                entities.append(
+                    AulaSensor(
+                        client,
+                        coordinators,
+                        config_entry.entry_id,
+                        child,
+                        config[CONF_UGEPLAN],
+                    )
                 )
-                entities.append(AulaSensor(hass, coordinator, child))
         else:
-            entities.append(AulaSensor(hass, coordinator, child))
+            entities.append(
+                AulaSensor(
+                    client,
+                    coordinators,
+                    config_entry.entry_id,
+                    child,
+                    config[CONF_UGEPLAN],
+                )
+            )
     # We have data and can now set up the calendar platform:
     if config[CONF_SCHOOLSCHEDULE]:
+        config["platforms"].append("calendar")
         hass.async_create_task(
             hass.config_entries.async_forward_entry_setup(config_entry, "calendar")
         )
     ####
+    config["platforms"].append("binary_sensor")
     hass.async_create_task(
         hass.config_entries.async_forward_entry_setup(config_entry, "binary_sensor")
     )
     ####
 
-    global ugeplan  # noqa: PLW0603
-    ugeplan = bool(config[CONF_UGEPLAN])
     async_add_entities(entities, update_before_add=True)
+    async_add_entities(
+        [
+            AulaRequestSensor(client, coordinators, config_entry.entry_id, kind)
+            for kind in ("requests", "latency")
+        ]
+    )
 
-    def custom_api_call_service(call: ServiceCall) -> ServiceResponse:
+    if hass.services.has_service(DOMAIN, API_CALL_SERVICE_NAME):
+        return
+
+    async def custom_api_call_service(call: ServiceCall) -> ServiceResponse:
+        # Calls go to the given config entry, or else the first loaded one.
+        clients = {
+            entry_id: data["client"]
+            for entry_id, data in hass.data[DOMAIN].items()
+            if "client" in data
+        }
+        entry_id = call.data.get("config_entry_id")
+        if entry_id is not None:
+            if entry_id not in clients:
+                raise ServiceValidationError(f"Unknown Aula config entry {entry_id}")
+            client = clients[entry_id]
+        elif clients:
+            client = next(iter(clients.values()))
+        else:
+            raise ServiceValidationError("No Aula config entry is loaded")
         if "post_data" in call.data and len(call.data["post_data"]) > 0:
-            data = client.custom_api_call(call.data["uri"], call.data["post_data"])
+            data = await client.custom_api_call(
+                call.data["uri"], call.data["post_data"]
+            )
         else:
-            data = client.custom_api_call(call.data["uri"], 0)
+            data = await client.custom_api_call(call.data["uri"], 0)
         return data
 
     hass.services.async_register(
@@ -115,12 +272,20 @@ async def async_setup_entry(
 class AulaSensor(Entity):
     """AulaSensor."""
 
-    def __init__(self, hass: HomeAssistant, coordinator, child) -> None:
+    def __init__(
+        self, client: Client, coordinators, entry_id, child, ugeplan
+    ) -> None:
         """Init."""
-        self._hass = hass
-        self._coordinator = coordinator
+        self._entry_id = entry_id
+        self._coordinator = coordinators["presence"]
+        self._ugeplan_coordinator = coordinators.get("ugeplan")
         self._child = child
-        self._client = hass.data[DOMAIN]["client"]
+        self._client = client
+        self._ugeplan = bool(ugeplan)
+        # Attributes are only rebuilt when the coordinators have new data,
+        # and state is only written when they changed.
+        self._snapshot = self._build_snapshot()
+        self._digest = None
 
     @property
     def name(self):
@@ -132,118 +297,65 @@ class AulaSensor(Entity):
     @property
     def state(self):
         """States."""
-        # 0 = IKKE KOMMET
-        # 1 = SYG
-        # 2 = FERIE/FRI
-        # 3 = KOMMET/TIL STEDE
-        # 4 = PÅ TUR
-        # 5 = SOVER
-        # 8 = HENTET/GÅET
-        if self._client.presence[str(self._child["id"])] == 1:
-            states = [
-                "Ikke kommet",
-                "Syg",
-                "Ferie/Fri",
-                "Kommet/Til stede",
-                "På tur",
-                "Sover",
-                "6",
-                "7",
-                "Gået",
-                "9",
-                "10",
-                "11",
-                "12",
-                "13",
-                "14",
-                "15",
-            ]
-            daily_info = self._client.daily_overview[str(self._child["id"])]
-            return states[daily_info["status"]]
-        _LOGGER.debug(f"Setting state to n/a for child {str(self._child['id'])}")  # noqa: G004
-        return "n/a"
+        return self._snapshot[0]
 
     @property
     def extra_state_attributes(self):
         """Attr."""
-        if self._client.presence[str(self._child["id"])] == 1:
-            daily_info = self._client.daily_overview[str(self._child["id"])]
+        return self._snapshot[1]
+
+    def _build_snapshot(self):
+        """State and attributes of the child, built once per update."""
+        childid = str(self._child["id"])
+        if self._client.presence[childid] == 1:
+            daily_info = self._client.daily_overview[childid]
+            state = PRESENCE_STATES[daily_info["status"]]
             try:
                 profilePicture = daily_info["institutionProfile"]["profilePicture"][
                     "url"
                 ]
             except Exception:  # pylint: disable=broad-except
                 profilePicture = None
+        else:
+            _LOGGER.debug(f"Setting state to n/a for child {childid}")  # noqa: G004
+            state = "n/a"
 
-        fields = [
-            "location",
-            "sleepIntervals",
-            "checkInTime",
-            "checkOutTime",
-            "activityType",
-            "entryTime",
-            "exitTime",
-            "exitWith",
-            "comment",
-            "spareTimeActivity",
-            "selfDeciderStartTime",
-            "selfDeciderEndTime",
-        ]
         attributes = {}
-        # _LOGGER.debug("Dump of ugep_attr: "+str(self._client.ugep_attr))
-        # _LOGGER.debug("Dump of ugepnext_attr: "+str(self._client.ugepnext_attr))
-        if ugeplan:
+        name = self._child["name"].split()[0]
+        if self._ugeplan:
             if "0030" in self._client.widgets:
                 try:
-                    name = self._child["name"].split()[0]
-                    try:
-                        opgaver = self._client.opg_attr[name]
-                        attributes["opgaver"] = json.dumps(opgaver)
-                    except Exception:  # pylint: disable=broad-except
-                        attributes["Opgaver"] = "Not available"
-                    try:
-                        opgaver_next = self._client.opgnext_attr[name]
-                        attributes["opgaver_next"] = json.dumps(opgaver_next)
-                    except Exception:  # pylint: disable=broad-except
-                        attributes["opgaver_next"] = "Not available"
+                    opgaver = self._client.opg_attr[name]
+                    attributes["opgaver"] = json.dumps(opgaver)
                 except Exception:  # pylint: disable=broad-except
                     attributes["Opgaver"] = "Not available"
-
-            if "0062" in self._client.widgets:
                 try:
-                    attributes["huskelisten"] = self._client.huskeliste[
-                        self._child["name"].split()[0]
-                    ]
+                    opgaver_next = self._client.opgnext_attr[name]
+                    attributes["opgaver_next"] = json.dumps(opgaver_next)
                 except Exception:  # pylint: disable=broad-except
-                    attributes["huskelisten"] = "Not available"
-            try:
-                attributes["ugeplan"] = self._client.ugep_attr[
-                    self._child["name"].split()[0]
-                ]
-            except Exception:  # pylint: disable=broad-except
-                attributes["ugeplan"] = "Not available"
-            try:
-                attributes["ugeplan_next"] = self._client.ugepnext_attr[
-                    self._child["name"].split()[0]
-                ]
-            except Exception:  # pylint: disable=broad-except
+                    attributes["opgaver_next"] = "Not available"
+
+            if "0062" in self._client.widgets:
+                attributes["huskelisten"] = self._client.huskeliste.get(
+                    name, "Not available"
+                )
+            attributes["ugeplan"] = self._client.ugep_attr.get(name, "Not available")
+            if name in self._client.ugepnext_attr:
+                attributes["ugeplan_next"] = self._client.ugepnext_attr[name]
+            else:
                 attributes["ugeplan_next"] = "Not available"
                 _LOGGER.debug(
-                    f"Could not get ugeplan for next week for child {str(self._child["name"].split()[0])}. Perhaps not available yet"  # noqa: G004
+                    f"Could not get ugeplan for next week for child {name}. Perhaps not available yet"  # noqa: G004
                 )
-        if self._client.presence[str(self._child["id"])] == 1:
-            for attribute in fields:
-                if attribute == "exitTime" and daily_info[attribute] == "23:59:00":
+        if self._client.presence[childid] == 1:
+            for attribute in PRESENCE_FIELDS:
+                value = daily_info[attribute]
+                if attribute == "exitTime" and value == "23:59:00":
                     attributes[attribute] = None
                 else:
-                    try:
-                        attributes[attribute] = datetime.strptime(
-                            daily_info[attribute], "%H:%M:%S"
-                        ).strftime("%H:%M")
-                    except Exception:  # pylint: disable=broad-except
-                        attributes[attribute] = daily_info[attribute]
+                    attributes[attribute] = _hhmm(value)
             attributes["profilePicture"] = profilePicture
-        return attributes
+        return state, MappingProxyType(attributes)
 
     @property
     def should_poll(self):
@@ -258,7 +370,7 @@ class AulaSensor(Entity):
     @property
     def unique_id(self):
         """UniqueId."""
-        unique_id = "aula" + str(self._child["id"])
+        unique_id = f"{self._entry_id}_child_{self._child['id']}"
         _LOGGER.debug(f"Unique ID for child {str(self._child["id"])} {unique_id}")  # noqa: G004
         return unique_id
 
@@ -271,6 +383,92 @@ class AulaSensor(Entity):
         """Update the entity. Only used by the generic entity update service."""
         await self._coordinator.async_request_refresh()
 
+    async def async_added_to_hass(self):
+        """When entity is added to hass.
+
+        The snapshot is rebuilt from the current data, so the state Home
+        Assistant writes right after this is also what later updates are
+        compared with.
+        """
+        self._snapshot = self._build_snapshot()
+        self._digest = self._snapshot_digest(self._snapshot)
+        self.async_on_remove(
+            self._coordinator.async_add_listener(self._handle_coordinator_update)
+        )
+        if self._ugeplan_coordinator is not None:
+            self.async_on_remove(
+                self._ugeplan_coordinator.async_add_listener(
+                    self._handle_coordinator_update
+                )
+            )
+
+    def _snapshot_digest(self, snapshot):
+        state, attributes = snapshot
+        return hashlib.sha1(
+            json.dumps(
+                [state, self.available, dict(attributes)], sort_keys=True, default=str
+            ).encode("utf-8")
+        ).digest()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Rebuild the snapshot and write it only if it changed."""
+        snapshot = self._build_snapshot()
+        digest = self._snapshot_digest(snapshot)
+        if digest == self._digest:
+            return
+        self._snapshot = snapshot
+        self._digest = digest
+        self.async_write_ha_state()
+
+
+class AulaRequestSensor(Entity):
+    """Diagnostic sensor with the outbound request statistics of an account."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_should_poll = False
+
+    def __init__(self, client: Client, coordinators, entry_id, kind) -> None:
+        """Init."""
+        self._coordinator = coordinators["presence"]
+        self._client = client
+        self._kind = kind
+        self._attr_unique_id = f"{entry_id}_{kind}"
+        if kind == "requests":
+            self._attr_name = "Aula requests"
+            self._attr_icon = "mdi:counter"
+        else:
+            self._attr_name = "Aula request latency"
+            self._attr_icon = "mdi:timer-outline"
+            self._attr_unit_of_measurement = UnitOfTime.MILLISECONDS
+
+    @property
+    def state(self):
+        """Total requests, or the mean latency of all requests."""
+        stats = self._client.request_stats().values()
+        requests = sum(s["requests"] for s in stats)
+        if self._kind == "requests":
+            return requests
+        if requests == 0:
+            return None
+        return round(
+            sum(s["mean_ms"] * s["requests"] for s in stats if s["requests"])
+            / requests
+        )
+
+    @property
+    def extra_state_attributes(self):
+        """Per endpoint counts or latencies."""
+        if self._kind == "requests":
+            fields = ("requests", "errors", "retries", "bytes")
+        else:
+            fields = ("mean_ms", "p50_ms", "p95_ms")
+        return {
+            name: {field: stats[field] for field in fields}
+            for name, stats in self._client.request_stats().items()
+        }
+
     async def async_added_to_hass(self):
         """When entity is added to hass."""
         self.async_on_remove(
@@ -0,0 +1,511 @@
+"""Timeouts, retries and circuit breaking for outbound requests."""
+import asyncio
+from bisect import bisect_left
+import contextlib
+import json
+import logging
+import random
+import re
+import time
+
+import aiohttp
+from yarl import URL
+
+_LOGGER = logging.getLogger(__name__)
+
+AULA_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+WIDGET_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=10)
+HOST_TIMEOUTS = {
+    "www.aula.dk": AULA_TIMEOUT,
+    "login.aula.dk": AULA_TIMEOUT,
+    "broker.unilogin.dk": AULA_TIMEOUT,
+    "api.minuddannelse.net": WIDGET_TIMEOUT,
+    "app.meebook.com": WIDGET_TIMEOUT,
+    "systematic-momo.dk": WIDGET_TIMEOUT,
+}
+DEFAULT_TIMEOUT = AULA_TIMEOUT
+# GETs are retried this many times on connection errors, timeouts and 5xx
+# answers, sleeping a random time up to BACKOFF * 2**attempt in between.
+RETRIES = 2
+BACKOFF = 0.5
+# After BREAKER_THRESHOLD failed requests in a row a host is skipped for
+# BREAKER_COOLDOWN seconds. One request is then let through to probe it.
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 5 * 60
+# Upper bounds in seconds of the latency histogram buckets; the last bucket
+# takes everything slower. Endpoints past MAX_ENDPOINTS are counted as other.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MAX_ENDPOINTS = 64
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host that keeps failing."""
+
+
+class Response:
+    """A fully read HTTP response."""
+
+    def __init__(self, status_code: int, url: str, text: str) -> None:
+        """Init."""
+        self.status_code = status_code
+        self.url = url
+        self.text = text
+
+    def json(self):
+        """Decode the body as json."""
+        return json.loads(self.text, strict=False)
+
+
+def endpoint(url) -> str:
+    """Name requests to the same endpoint alike.
+
+    Aula API calls are named by their method, everything else by host and path.
+    """
+    url = URL(str(url))
+    if url.host == "www.aula.dk" and url.path.startswith("/api/"):
+        return "aula " + url.query.get("method", url.path)
+    return f"{url.host}{url.path}"
+
+
+class EndpointStats:
+    """Request count, sizes and a latency histogram for one endpoint."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.status = None
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds, status, size, retries):
+        """Record one call, including its retries."""
+        self.requests += 1
+        self.retries += retries
+        self.bytes += size
+        self.seconds += seconds
+        self.status = status
+        if status is None or status >= 500:
+            self.errors += 1
+        self.histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q) -> float | None:
+        """Upper bound of the bucket holding the q quantile, in seconds."""
+        rank = q * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram, strict=False):
+            seen += count
+            if seen >= rank and seen > 0:
+                return bound
+        return None if self.requests == 0 else float("inf")
+
+    def as_dict(self):
+        """Summary for diagnostics and sensor attributes."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "mean_ms": round(1000 * self.seconds / self.requests)
+            if self.requests
+            else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "last_status": self.status,
+            "histogram": dict(
+                zip(
+                    [f"<={bound}s" for bound in LATENCY_BUCKETS] + ["slower"],
+                    self.histogram,
+                    strict=True,
+                )
+            ),
+        }
+
+
+def _ms(seconds):
+    if seconds is None or seconds == float("inf"):
+        return None
+    return round(seconds * 1000)
+
+
+# Personal data that is removed from cassettes whatever the replacements.
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+JWT = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+")
+# Long hidden form values, like the SAML assertion of the login.
+FORM_VALUE = re.compile(r'value="[^"]{40,}"')
+# JSON fields scrubbed from cassettes by key. Names get a pseudonym that is
+# the same wherever the name occurs, free text keeps its markup and length
+# with every letter masked, and contact details are dropped.
+NAME_KEYS = frozenset(
+    {
+        "name",
+        "fullName",
+        "firstName",
+        "lastName",
+        "shortName",
+        "displayName",
+        "userName",
+        "navn",
+        "kuvertnavn",
+        "teacherName",
+        "teacherInitials",
+        "createdBy",
+        "author",
+        "institutionName",
+    }
+)
+TEXT_KEYS = frozenset(
+    {
+        "text",
+        "html",
+        "subject",
+        "comment",
+        "indhold",
+        "content",
+        "reminderText",
+    }
+)
+DROP_KEYS = frozenset(
+    {
+        "email",
+        "phone",
+        "mobilePhoneNumber",
+        "homePhoneNumber",
+        "workPhoneNumber",
+        "address",
+        "street",
+        "postalCode",
+        "postalDistrict",
+        "birthday",
+        "profilePicture",
+    }
+)
+LETTER = re.compile(r"<[^>]*>|[^\W\d_]")
+
+
+def _anonymizer(replacements):
+    """Return a function applying replacements, emails and tokens to text."""
+    words = sorted((word for word in replacements if word), key=len, reverse=True)
+    pattern = (
+        re.compile("|".join(rf"(?<!\w){re.escape(word)}(?!\w)" for word in words))
+        if words
+        else None
+    )
+
+    def anonymize(text):
+        if pattern is not None:
+            text = pattern.sub(lambda match: replacements[match.group(0)], text)
+        text = EMAIL.sub("anonym@example.invalid", text)
+        return JWT.sub("token", text)
+
+    return anonymize
+
+
+class _Scrubber:
+    """Remove personal data from recorded bodies, by JSON key where possible."""
+
+    def __init__(self, replacements) -> None:
+        """Init."""
+        self._replacements = replacements
+        self._anonymize = _anonymizer(replacements)
+        self._pseudonyms = {}
+
+    def body(self, text):
+        """Scrubbed copy of a response body."""
+        try:
+            data = json.loads(text, strict=False)
+        except ValueError:
+            return FORM_VALUE.sub('value="anonym"', self._anonymize(text))
+        return json.dumps(self._scrub(data), ensure_ascii=False)
+
+    def _scrub(self, data, key=None):
+        if isinstance(data, dict):
+            return {k: self._scrub(v, k) for k, v in data.items()}
+        if isinstance(data, list):
+            return [self._scrub(v, key) for v in data]
+        if key in DROP_KEYS:
+            return None
+        if not isinstance(data, str):
+            return data
+        if key in NAME_KEYS:
+            return self._name(data)
+        if key in TEXT_KEYS:
+            return LETTER.sub(
+                lambda match: match.group(0) if match.group(0)[0] == "<" else "x",
+                data,
+            )
+        return self._anonymize(data)
+
+    def _name(self, name):
+        """Replacement of a name, or else a pseudonym used for it everywhere."""
+        if name in self._replacements:
+            return self._replacements[name]
+        if name.split() and all(word in self._replacements for word in name.split()):
+            return self._anonymize(name)
+        if name not in self._pseudonyms:
+            self._pseudonyms[name] = f"Navn{len(self._pseudonyms)} Anonym"
+        return self._pseudonyms[name]
+
+
+class Cassette:
+    """Responses recorded from, or replayed instead of, the real upstreams.
+
+    Replayed requests are matched on method and url first, then on method and
+    endpoint so urls with another date or id still get an answer. Responses
+    are handed out in recorded order; the last one is repeated.
+    """
+
+    def __init__(self, interactions=None) -> None:
+        """Init."""
+        self.interactions = interactions or []
+        self._played = set()
+
+    @classmethod
+    def load(cls, path):
+        """Read a cassette file."""
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file)["interactions"])
+
+    def save(self, path, replacements=None):
+        """Write the cassette, with personal data replaced.
+
+        replacements maps known words, such as credentials and the names of
+        the children, to what they are replaced with everywhere. Bodies are
+        then scrubbed field by field, see NAME_KEYS, TEXT_KEYS and DROP_KEYS.
+        """
+        anonymize = _anonymizer(replacements or {})
+        scrubber = _Scrubber(replacements or {})
+        interactions = [
+            {
+                **interaction,
+                "url": anonymize(interaction["url"]),
+                "final_url": anonymize(interaction["final_url"]),
+                "body": scrubber.body(interaction["body"]),
+            }
+            for interaction in self.interactions
+        ]
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"version": 1, "interactions": interactions}, file, indent=1)
+
+    def record(self, method, url, response: Response, elapsed):
+        """Remember a response."""
+        self.interactions.append(
+            {
+                "method": method,
+                "url": url,
+                "status": response.status_code,
+                "final_url": response.url,
+                "body": response.text,
+                "elapsed": round(elapsed, 4),
+            }
+        )
+
+    def play(self, method, url):
+        """Return the recorded response and its original duration."""
+        for matches in (
+            lambda i: i["url"] == url,
+            lambda i: endpoint(i["url"]) == endpoint(url),
+        ):
+            candidates = [
+                n
+                for n, interaction in enumerate(self.interactions)
+                if interaction["method"] == method and matches(interaction)
+            ]
+            if candidates:
+                fresh = [n for n in candidates if n not in self._played]
+                n = fresh[0] if fresh else candidates[-1]
+                self._played.add(n)
+                interaction = self.interactions[n]
+                return (
+                    Response(
+                        interaction["status"],
+                        interaction["final_url"],
+                        interaction["body"],
+                    ),
+                    interaction["elapsed"],
+                )
+        return None, 0
+
+
+class CircuitBreaker:
+    """Failure bookkeeping for one host."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.failures = 0
+        self.opened_at = None
+        # Set while the single request let through in half_open is running.
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        """closed, open or half_open."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Return True if the host may be called.
+
+        Once the cool-down is over one request is let through as a probe;
+        the others are refused until it has succeeded or failed.
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        """Record a request that got an answer."""
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        """Record a failed request, opening the breaker if needed."""
+        self.failures += 1
+        self.probing = False
+        if self.failures >= BREAKER_THRESHOLD or self.opened_at is not None:
+            # A failed probe while half open starts a new cool-down.
+            self.opened_at = time.monotonic()
+
+
+class Transport:
+    """Send requests with per-host timeouts, retries and circuit breakers."""
+
+    def __init__(
+        self,
+        rewrite: dict[str, str] | None = None,
+        record: Cassette | None = None,
+        replay: Cassette | None = None,
+        realtime: bool = False,
+        limit: asyncio.Semaphore | None = None,
+    ) -> None:
+        """Init.
+
+        rewrite maps upstream base urls to the base urls requests for them are
+        sent to instead, like a local mock server in the benchmarks. Responses
+        are added to the record cassette, or served from the replay cassette
+        without any network traffic, after their recorded duration if
+        realtime is set. limit bounds the requests in flight, and may be
+        shared with other transports.
+        """
+        self._rewrite = rewrite or {}
+        self._record = record
+        self._replay = replay
+        self._realtime = realtime
+        self._limit = limit or contextlib.nullcontext()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.stats: dict[str, EndpointStats] = {}
+
+    async def request(
+        self, session: aiohttp.ClientSession, method, url, **kwargs
+    ) -> Response:
+        """Send a request and read the whole response body."""
+        host = URL(str(url)).host
+        breaker = self._breakers.setdefault(host, CircuitBreaker())
+        probe = breaker.state == "half_open"
+        if not breaker.allow():
+            raise CircuitOpenError(f"{host} is failing, skipping requests to it")
+        try:
+            return await self._send(breaker, host, session, method, url, **kwargs)
+        finally:
+            if probe:
+                # A probe that was cancelled or raised makes way for the next.
+                breaker.probing = False
+
+    async def _send(
+        self, breaker: CircuitBreaker, host, session, method, url, **kwargs
+    ) -> Response:
+        """Send a request the breaker allowed, retrying GETs."""
+        kwargs.setdefault("timeout", HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT))
+        name = endpoint(url)
+        if name not in self.stats and len(self.stats) >= MAX_ENDPOINTS:
+            name = "other"
+        stats = self.stats.setdefault(name, EndpointStats())
+        if self._replay is not None:
+            return await self._replayed(method, str(url), stats)
+        retries = RETRIES if method == "GET" else 0
+        attempt = 0
+        start = time.monotonic()
+        while True:
+            try:
+                async with (
+                    self._limit,
+                    session.request(
+                        method, self._rewritten(str(url)), **kwargs
+                    ) as response,
+                ):
+                    body = await response.read()
+                    text = await response.text()
+                    result = Response(
+                        response.status, self._restored(str(response.url)), text
+                    )
+            except (aiohttp.ClientError, TimeoutError) as err:
+                if attempt >= retries:
+                    breaker.failure()
+                    stats.record(time.monotonic() - start, None, 0, attempt)
+                    raise
+                _LOGGER.debug(
+                    f"{method} {host} failed ({err!r}), retrying"  # noqa: G004
+                )
+            else:
+                if result.status_code < 500 or attempt >= retries:
+                    elapsed = time.monotonic() - start
+                    stats.record(elapsed, result.status_code, len(body), attempt)
+                    if self._record is not None:
+                        self._record.record(method, str(url), result, elapsed)
+                if result.status_code < 500:
+                    breaker.success()
+                    return result
+                if attempt >= retries:
+                    breaker.failure()
+                    return result
+                _LOGGER.debug(
+                    f"{method} {host} answered {result.status_code}, retrying"  # noqa: G004
+                )
+            await asyncio.sleep(random.uniform(0, BACKOFF * 2**attempt))
+            attempt += 1
+
+    async def _replayed(self, method, url, stats: EndpointStats) -> Response:
+        """Serve a request from the replay cassette."""
+        response, elapsed = self._replay.play(method, url)
+        if response is None:
+            stats.record(0.0, None, 0, 0)
+            raise aiohttp.ClientConnectionError(f"Nothing recorded for {method} {url}")
+        if self._realtime:
+            await asyncio.sleep(elapsed)
+        else:
+            elapsed = 0.0
+        stats.record(elapsed, response.status_code, len(response.text), 0)
+        return response
+
+    def _rewritten(self, url: str) -> str:
+        for upstream, target in self._rewrite.items():
+            if url.startswith(upstream):
+                return target + url[len(upstream) :]
+        return url
+
+    def _restored(self, url: str) -> str:
+        for upstream, target in self._rewrite.items():
+            if url.startswith(target):
+                return upstream + url[len(target) :]
+        return url
+
+    def diagnostics(self):
+        """Breaker state per host."""
+        return {
+            host: {"state": breaker.state, "failures": breaker.failures}
+            for host, breaker in self._breakers.items()
+        }
+
+    def stats_diagnostics(self):
+        """Request statistics per endpoint."""
+        return {name: stats.as_dict() for name, stats in sorted(self.stats.items())}
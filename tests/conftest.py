@@ -0,0 +1,42 @@
+"""Run the client against the mock Aula of the benchmarks."""
+import contextlib
+import pathlib
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+from aiohttp.test_utils import TestServer  # noqa: E402
+from mock_server import PASSWORD, USERNAME, MockAula, rewrite  # noqa: E402
+
+from custom_components.aula.client import Client  # noqa: E402
+from custom_components.aula.transport import Transport  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+
+@contextlib.asynccontextmanager
+async def mock_client(ugeplan=False, **mock_options):
+    """Logged in client talking to a fresh mock Aula."""
+    mock = MockAula(**mock_options)
+    server = TestServer(mock.app(), host="localhost")
+    await server.start_server()
+    mock.base = f"http://localhost:{server.port}"
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        client = Client(
+            hass,
+            USERNAME,
+            PASSWORD,
+            True,
+            ugeplan,
+            transport=Transport(rewrite=rewrite(mock.base)),
+        )
+        try:
+            await client.login()
+            yield client
+        finally:
+            await client.async_close()
+            # Closes the sessions the client has released to Home Assistant.
+            await hass.async_stop(force=True)
+            await server.close()
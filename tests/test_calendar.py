@@ -0,0 +1,64 @@
+"""School schedule weeks kept by the client."""
+import asyncio
+import datetime
+
+from conftest import mock_client
+
+from custom_components.aula.client import (
+    CALENDAR_WINDOWS,
+    _calendar_week,
+    _week_start,
+)
+
+CHILD = 1000
+
+
+def _weeks_with_lessons(lessons):
+    return {_calendar_week(lesson.start) for lesson in lessons}
+
+
+def _weeks(first, count):
+    return [first + datetime.timedelta(weeks=n) for n in range(count)]
+
+
+def test_request_beyond_the_pinned_weeks_is_complete():
+    async def run():
+        async with mock_client() as client:
+            await client.update_data()
+            this_week = _calendar_week(datetime.datetime.now(datetime.UTC))
+            start = _week_start(this_week + datetime.timedelta(weeks=3))
+            lessons = await client.async_get_lessons(
+                CHILD, start, start + datetime.timedelta(weeks=CALENDAR_WINDOWS)
+            )
+            assert _weeks_with_lessons(lessons) == set(
+                _weeks(_calendar_week(start), CALENDAR_WINDOWS)
+            )
+            # The weeks behind the entities are still there as well.
+            assert this_week in client._calendar_windows
+            assert this_week + datetime.timedelta(weeks=1) in client._calendar_windows
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_keep_their_weeks():
+    async def run():
+        async with mock_client() as client:
+            await client.update_data()
+            this_week = _calendar_week(datetime.datetime.now(datetime.UTC))
+            ranges = [
+                (start, start + datetime.timedelta(weeks=CALENDAR_WINDOWS))
+                for start in (
+                    _week_start(this_week + datetime.timedelta(weeks=3)),
+                    _week_start(this_week + datetime.timedelta(weeks=20)),
+                )
+            ]
+            results = await asyncio.gather(
+                *(client.async_get_lessons(CHILD, start, end) for start, end in ranges)
+            )
+            for (start, _end), lessons in zip(ranges, results, strict=True):
+                assert _weeks_with_lessons(lessons) == set(
+                    _weeks(_calendar_week(start), CALENDAR_WINDOWS)
+                )
+            assert len(client._weeks_in_use) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+"""Telling an expired Aula session from other answers."""
+import json
+
+import pytest
+
+from custom_components.aula.client import (
+    STATUS_BODY_LIMIT,
+    _is_auth_failure,
+    _is_portal,
+)
+from custom_components.aula.transport import Response
+
+
+def _answer(http_status, code, message="", data=None):
+    body = json.dumps({"status": {"code": code, "message": message}, "data": data})
+    return Response(http_status, "https://www.aula.dk/api/", body)
+
+
+@pytest.mark.parametrize(
+    ("response", "allow_status", "expected"),
+    [
+        (_answer(200, 0, "OK"), (), False),
+        (_answer(200, 500, "Internal error"), (), False),
+        (_answer(400, 400, "Bad request"), (), False),
+        (Response(500, "https://www.aula.dk/api/", "<html>"), (), False),
+        (_answer(403, 448, "Not logged in"), (), True),
+        (_answer(200, 448, "Not logged in"), (), True),
+        (Response(401, "https://www.aula.dk/api/", "<html>"), (), True),
+        (_answer(403, 403, "Sensitive"), (403,), False),
+        (_answer(200, 403, "Sensitive"), (403,), False),
+    ],
+)
+def test_only_a_rejected_session_is_an_auth_failure(response, allow_status, expected):
+    assert _is_auth_failure(response, allow_status) is expected
+
+
+def test_a_probe_takes_any_error_as_an_expired_session():
+    assert _is_auth_failure(_answer(200, 500, "Internal error"), (), probe=True)
+    assert not _is_auth_failure(_answer(200, 0, "OK"), (), probe=True)
+
+
+def test_large_successful_answers_are_not_decoded():
+    class Undecodable(Response):
+        def json(self):
+            raise AssertionError("decoded")
+
+    response = Undecodable(
+        200, "https://www.aula.dk/api/", "x" * (STATUS_BODY_LIMIT + 1)
+    )
+    assert not _is_auth_failure(response, ())
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://www.aula.dk/portal/", True),
+        ("https://www.aula.dk/portal/?type=unilogin", True),
+        ("https://www.aula.dk:443/portal/", True),
+        ("https://www.aula.dk/portal", True),
+        ("https://www.aula.dk/auth/login.php", False),
+        ("https://login.aula.dk/portal/", False),
+    ],
+)
+def test_login_ends_on_the_portal(url, expected):
+    assert _is_portal(url) is expected
@@ -0,0 +1,101 @@
+"""Circuit breakers of the transport."""
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+
+from custom_components.aula import transport
+from custom_components.aula.transport import CircuitOpenError, Transport
+
+
+class Host:
+    """Web server answering 503 until it is fixed."""
+
+    def __init__(self) -> None:
+        self.status = 503
+        self.hits = 0
+
+    async def handle(self, request):
+        self.hits += 1
+        await asyncio.sleep(0.05)
+        return web.Response(status=self.status)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("*", "/", self.handle)
+        return app
+
+
+@pytest.fixture(autouse=True)
+def _fast(monkeypatch):
+    monkeypatch.setattr(transport, "BACKOFF", 0.001)
+    monkeypatch.setattr(transport, "RETRIES", 0)
+
+
+async def _burst(client, session, url, count=5):
+    return await asyncio.gather(
+        *(client.request(session, "GET", url) for _ in range(count)),
+        return_exceptions=True,
+    )
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    async def run():
+        host = Host()
+        server = TestServer(host.app(), host="localhost")
+        await server.start_server()
+        client = Transport()
+        url = str(server.make_url("/"))
+        try:
+            async with aiohttp.ClientSession() as session:
+                for _ in range(transport.BREAKER_THRESHOLD):
+                    await client.request(session, "POST", url)
+                with pytest.raises(CircuitOpenError):
+                    await client.request(session, "GET", url)
+
+                # Cool-down over, host still failing: one probe, open again.
+                monkeypatch.setattr(transport, "BREAKER_COOLDOWN", 0)
+                hits = host.hits
+                results = await _burst(client, session, url)
+                refused = [r for r in results if isinstance(r, CircuitOpenError)]
+                assert len(refused) == len(results) - 1
+                assert host.hits == hits + 1
+
+                # The host works again: the probe closes the breaker.
+                host.status = 200
+                results = await _burst(client, session, url)
+                assert sum(isinstance(r, CircuitOpenError) for r in results) == 4
+                results = await _burst(client, session, url)
+                assert [r.status_code for r in results] == [200] * len(results)
+        finally:
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_a_cancelled_probe_makes_way_for_the_next(monkeypatch):
+    async def run():
+        host = Host()
+        server = TestServer(host.app(), host="localhost")
+        await server.start_server()
+        client = Transport()
+        url = str(server.make_url("/"))
+        try:
+            async with aiohttp.ClientSession() as session:
+                for _ in range(transport.BREAKER_THRESHOLD):
+                    await client.request(session, "POST", url)
+                monkeypatch.setattr(transport, "BREAKER_COOLDOWN", 0)
+                probe = asyncio.create_task(client.request(session, "GET", url))
+                await asyncio.sleep(0.01)
+                probe.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await probe
+                host.status = 200
+                response = await client.request(session, "GET", url)
+                assert response.status_code == 200
+        finally:
+            await server.close()
+
+    asyncio.run(run())